@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 # Load environment variables from a .env file
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
@@ -12,10 +14,33 @@ class Config:
         f"@{os.environ.get('DB_HOST')}:{os.environ.get('DB_PORT')}/{os.environ.get('DB_NAME')}"
     )
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL')  # Override the API endpoint (proxies, local fake server)
+    LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 4))  # Parallel LLM requests per call site
+    LLM_REQUESTS_PER_MINUTE = int(os.environ.get('LLM_REQUESTS_PER_MINUTE', 60))  # 0 disables the limit
+    LLM_TOKENS_PER_MINUTE = int(os.environ.get('LLM_TOKENS_PER_MINUTE', 40000))  # 0 disables the limit
+    LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', 3))
+    LLM_REQUEST_TIMEOUT = float(os.environ.get('LLM_REQUEST_TIMEOUT', 60))  # Seconds per request
+    LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', os.path.join(BASE_DIR, 'data', 'llm_cache.db'))  # Cached LLM replies
+    LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+    LLM_CACHE_TTL_SECONDS = int(os.environ.get('LLM_CACHE_TTL_SECONDS', 60 * 60))  # Replies hold statement data; keep them no longer than a session
+    TAG_BATCH_TOKENS = int(os.environ.get('TAG_BATCH_TOKENS', 1000))  # Prompt tokens of products per tagging request
+    TAG_BATCH_TIMEOUT = float(os.environ.get('TAG_BATCH_TIMEOUT', 30))  # Seconds before a tagging batch is given up
+    TAG_TRAINING_MAPPINGS_PATH = os.environ.get('TAG_TRAINING_MAPPINGS_PATH', os.path.join(BASE_DIR, 'static', 'sample_data', 'product_mappings.csv'))
+    TAG_CORRECTIONS_PATH = os.environ.get('TAG_CORRECTIONS_PATH', os.path.join(BASE_DIR, 'data', 'tag_corrections.db'))  # User tag edits, used as training data
+    TAG_CLASSIFIER_MIN_CONFIDENCE = float(os.environ.get('TAG_CLASSIFIER_MIN_CONFIDENCE', 0.6))  # Below this a product goes to the LLM
+    PRODUCT_MATCH_THRESHOLD = float(os.environ.get('PRODUCT_MATCH_THRESHOLD', 0.7))  # Min trigram similarity to reuse a mapped product's tag
+    TAG_CACHE_PATH = os.environ.get('TAG_CACHE_PATH', os.path.join(BASE_DIR, 'data', 'tag_cache.db'))  # Cached product tag suggestions
+    TAG_CACHE_SCOPE = os.environ.get('TAG_CACHE_SCOPE', 'session')  # 'session', or 'shared' across sessions (single-tenant deployments only)
+    TAG_CACHE_TTL_SECONDS = int(os.environ.get('TAG_CACHE_TTL_SECONDS', 30 * 24 * 3600))
+    TAG_CACHE_LRU_SIZE = int(os.environ.get('TAG_CACHE_LRU_SIZE', 10000))  # Entries kept in memory
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
     ALLOWED_EXTENSIONS = {'csv'}  # Allowed file extensions for uploads
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # Maximum file upload size: 16MB
     SQLALCHEMY_TRACK_MODIFICATIONS = False  # To disable FSADeprecationWarning
+    PRODUCT_TAG_UPSERT_CHUNK_ROWS = int(os.environ.get('PRODUCT_TAG_UPSERT_CHUNK_ROWS', 1000))  # Products per product_tags upsert/update statement
+    TRANSACTION_INSERT_CHUNK_ROWS = int(os.environ.get('TRANSACTION_INSERT_CHUNK_ROWS', 5000))  # Rows per INSERT batch
+    EDIT_PAGE_SIZE = int(os.environ.get('EDIT_PAGE_SIZE', 50))  # Transactions per /edit page when the client sends no limit
+    EDIT_MAX_PAGE_SIZE = int(os.environ.get('EDIT_MAX_PAGE_SIZE', 500))
     ENABLE_AI=os.environ.get('ENABLE_AI')
     USE_CHATGPT=os.environ.get('USE_CHATGPT')
     BATCH_SIZE=os.environ.get('BATCH_SIZE')
@@ -23,6 +48,23 @@ class Config:
     S3_BUCKET_NAME = os.environ.get('S3_BUCKET_NAME', 'terra-upload')
     S3_UPLOAD_PREFIX = os.environ.get('S3_UPLOAD_PREFIX', 'uploads').strip('/')
     S3_SAMPLE_PREFIX = os.environ.get('S3_SAMPLE_PREFIX', 'sample_data').strip('/')
+    CSV_READER_ENGINE = os.environ.get('CSV_READER_ENGINE', 'auto')  # auto, pyarrow, c or python
+    EXCEL_READER_ENGINE = os.environ.get('EXCEL_READER_ENGINE', 'auto')  # auto, calamine or openpyxl
+    INGEST_CHUNK_ROWS = int(os.environ.get('INGEST_CHUNK_ROWS', 50000))  # Rows per chunk when streaming uploads
+    ANALYZE_MAX_WORKERS = int(os.environ.get('ANALYZE_MAX_WORKERS', 4))  # Files downloaded and processed at once per /analyze request
+    ANALYZE_PARSE_WORKERS = int(os.environ.get('ANALYZE_PARSE_WORKERS', 0))  # CSV/Excel parsing processes; 0 parses in the request's worker threads
+    ANALYZE_STREAM_CHUNK_ROWS = int(os.environ.get('ANALYZE_STREAM_CHUNK_ROWS', 2000))  # Transactions per NDJSON line from /analyze
+    NARRATION_RULES_PATH = os.environ.get('NARRATION_RULES_PATH', os.path.join(BASE_DIR, 'static', 'narration_rules.json'))
+    RESULT_STAGING_PATH = os.environ.get('RESULT_STAGING_PATH', os.path.join(BASE_DIR, 'data', 'staged'))  # Parsed /analyze results awaiting /consolidate-files
+    RESULT_STAGING_TTL_SECONDS = int(os.environ.get('RESULT_STAGING_TTL_SECONDS', 60 * 60))  # Matches the 60-minute session lifetime
+    JOB_QUEUE_PATH = os.environ.get('JOB_QUEUE_PATH', os.path.join(BASE_DIR, 'data', 'jobs.db'))  # Background analyze/categorize jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))  # Jobs run at once per server process
+    JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', 60 * 60))  # Finished jobs are kept this long; matches the 60-minute session lifetime
+    LAYOUT_CACHE_PATH = os.environ.get('LAYOUT_CACHE_PATH', os.path.join(BASE_DIR, 'data', 'layouts.db'))  # Statement layout cache
+    PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', 0))  # Page extraction processes; 0 extracts in the request thread
+    PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 4))  # Pages handed to a worker at a time
+    PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 8))  # Smaller PDFs are extracted serially
+    PDF_WORKER_MAX_PAGES = int(os.environ.get('PDF_WORKER_MAX_PAGES', 200))  # Pages a worker extracts before it is replaced
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -1,13 +1,20 @@
 from db.models import Transactions, Session, ProductTag, Expense
 from db.models import db
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import base64
+import json
 import logging
+import time
 import numpy as np
+from config import Config
 
 from flask import current_app
 
-from sqlalchemy import text
+from sqlalchemy import and_, case, delete, func, or_, select, text, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from uuid import uuid4
 from datetime import datetime, timedelta
 
@@ -65,24 +72,258 @@ class DatabaseService:
             db.session.rollback()
 
 
+    def upsert_product_tags(self, rows, commit=True) -> int:
+        """Insert or update (session_id, product, tag) rows; returns the number of rows written.
+
+        Each chunk of ``PRODUCT_TAG_UPSERT_CHUNK_ROWS`` is one multi-row
+        INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT DO UPDATE on SQLite)
+        against the (session_id, product) unique key. A NULL tag never
+        overwrites an existing one. Commits once at the end unless
+        ``commit`` is False.
+        """
+        rows = list({(session_id, product): tag for session_id, product, tag in rows}.items())
+        table = ProductTag.__table__
+        dialect = db.session.get_bind().dialect.name
+        chunk_rows = Config.PRODUCT_TAG_UPSERT_CHUNK_ROWS
+        for offset in range(0, len(rows), chunk_rows):
+            values = [
+                {'session_id': session_id, 'product': product, 'tag': tag}
+                for (session_id, product), tag in rows[offset:offset + chunk_rows]
+            ]
+            if dialect == 'mysql':
+                stmt = mysql_insert(table).values(values)
+                stmt = stmt.on_duplicate_key_update(tag=func.coalesce(stmt.inserted.tag, table.c.tag))
+            elif dialect == 'sqlite':
+                stmt = sqlite_insert(table).values(values)
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=['session_id', 'product'],
+                    set_={'tag': func.coalesce(stmt.excluded.tag, table.c.tag)},
+                )
+            else:
+                raise ValueError(f"Product tag upsert is not supported on {dialect}")
+            db.session.execute(stmt)
+        if commit:
+            self.commit_changes()
+        return len(rows)
+
+    def set_product_tag(self, session_id, product, tag) -> None:
+        """Tag a product and all of its transactions in the session.
+
+        One upsert of the product_tags row and one UPDATE of transactions,
+        limited to rows whose tag actually changes, so rows the
+        update_transactions_tag trigger already rewrote are not written again.
+        """
+        self.upsert_product_tags([(session_id, product, tag)], commit=False)
+        transactions = Transactions.__table__
+        db.session.execute(
+            update(transactions)
+            .where(
+                transactions.c.session_id == session_id,
+                transactions.c.product == product,
+                or_(transactions.c.tag.is_(None), transactions.c.tag != tag),
+            )
+            .values(tag=tag)
+        )
+        self.commit_changes()
+
+    def rename_product(self, session_id, old_product, new_product) -> None:
+        """Rename a product across the session's product_tags and transactions.
+
+        Renaming onto a product that already has a product_tags row merges
+        into it: the old row is dropped, the existing row is kept, and the
+        moved transactions take its tag.
+        """
+        product_tags = ProductTag.__table__
+        transactions = Transactions.__table__
+        target = db.session.execute(
+            select(product_tags.c.tag).where(
+                product_tags.c.session_id == session_id, product_tags.c.product == new_product
+            )
+        ).first()
+        old_rows = (product_tags.c.session_id == session_id) & (product_tags.c.product == old_product)
+        moved = {"product": new_product}
+        if target:
+            db.session.execute(delete(product_tags).where(old_rows))
+            moved["tag"] = target.tag
+        else:
+            db.session.execute(update(product_tags).where(old_rows).values(product=new_product))
+        db.session.execute(
+            update(transactions)
+            .where(transactions.c.session_id == session_id, transactions.c.product == old_product)
+            .values(**moved)
+        )
+        self.commit_changes()
+
+    def rename_transaction_product(self, transaction_id, session_id, new_product, tag) -> None:
+        """Point one transaction at ``new_product`` and make sure that product has a tag row"""
+        transactions = Transactions.__table__
+        db.session.execute(
+            update(transactions).where(transactions.c.id == transaction_id).values(product=new_product)
+        )
+        self.upsert_product_tags([(session_id, new_product, tag)], commit=False)
+        self.commit_changes()
+
+    def get_average_debit(self, session_id, product):
+        """Average debit amount of a product's transactions in the session, or None"""
+        transactions = Transactions.__table__
+        average = db.session.execute(
+            select(func.avg(transactions.c.debit_amount)).where(
+                transactions.c.session_id == session_id, transactions.c.product == product
+            )
+        ).scalar()
+        return float(average) if average is not None else None
+
+    # /edit field name -> transactions column. Sort keys are limited to columns
+    # with a (session_id, column) index so every page is an index range scan.
+    EDIT_FIELDS = {
+        'id': 'id',
+        'date': 'transaction_date',
+        'narration': 'narration',
+        'product': 'product',
+        'debit_amount': 'debit_amount',
+        'credit_amount': 'credit_amount',
+        'tag': 'tag',
+        'mode': 'mode',
+    }
+    EDIT_SORT_KEYS = ('date', 'product', 'debit_amount', 'credit_amount', 'tag', 'mode', 'id')
+    EDIT_PREFIX_FILTERS = ('tag', 'mode', 'product')
+
+    def get_transactions_page(self, session_id, filters=None, sort=None, direction='asc',
+                              limit=None, cursor=None, fields=None):
+        """One keyset-paginated page of a session's transactions.
+
+        ``filters`` takes tag / mode / product prefixes, a ``date_from`` /
+        ``date_to`` range and a free-text ``search`` over narration and
+        product. Rows are ordered by ``sort`` with id as the tie-breaker, and
+        ``cursor`` is the ``next_cursor`` of the previous page, so a page
+        costs the same wherever it sits in the listing. Returns
+        ``(rows, next_cursor)``; next_cursor is None on the last page. Bad
+        parameters raise ``ValueError``.
+        """
+        transactions = Transactions.__table__
+        sort = sort or 'date'
+        if sort not in self.EDIT_SORT_KEYS:
+            raise ValueError(f"Cannot sort by {sort!r}; use one of {', '.join(self.EDIT_SORT_KEYS)}")
+        if direction not in ('asc', 'desc'):
+            raise ValueError("direction must be 'asc' or 'desc'")
+        fields = list(dict.fromkeys(['id', *(fields or self.EDIT_FIELDS)]))
+        unknown = [field for field in fields if field not in self.EDIT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(map(str, unknown))}")
+        limit = max(1, min(int(limit or Config.EDIT_PAGE_SIZE), Config.EDIT_MAX_PAGE_SIZE))
+
+        sort_column = transactions.c[self.EDIT_FIELDS[sort]]
+        conditions = [transactions.c.session_id == session_id, *self._edit_filters(filters or {})]
+        if cursor:
+            conditions.append(self._after_cursor(cursor, sort_column, direction))
+
+        order = (sort_column.asc(), transactions.c.id.asc()) if direction == 'asc' \
+            else (sort_column.desc(), transactions.c.id.desc())
+        columns = {self.EDIT_FIELDS[field] for field in fields} | {sort_column.name}
+        query = (
+            select(*(transactions.c[column] for column in columns))
+            .where(*conditions)
+            .order_by(*order)
+            .limit(limit + 1)
+        )
+        results = db.session.execute(query).mappings().all()
+
+        next_cursor = None
+        if len(results) > limit:
+            results = results[:limit]
+            last = results[-1]
+            next_cursor = self._encode_cursor(last[sort_column.name], last['id'])
+        rows = [{field: self._json_value(field, row[self.EDIT_FIELDS[field]]) for field in fields} for row in results]
+        return rows, next_cursor
+
+    def _edit_filters(self, filters):
+        transactions = Transactions.__table__
+        conditions = []
+        for field in self.EDIT_PREFIX_FILTERS:
+            value = filters.get(field)
+            if value:
+                column = transactions.c[self.EDIT_FIELDS[field]]
+                conditions.append(column.like(f"{self._escape_like(value)}%", escape='\\'))
+        date_from, date_to = self._filter_date(filters, 'date_from'), self._filter_date(filters, 'date_to')
+        if date_from:
+            conditions.append(transactions.c.transaction_date >= date_from)
+        if date_to:
+            conditions.append(transactions.c.transaction_date <= date_to)
+        if filters.get('search'):
+            pattern = f"%{self._escape_like(filters['search'])}%"
+            conditions.append(or_(
+                transactions.c.narration.like(pattern, escape='\\'),
+                transactions.c.product.like(pattern, escape='\\'),
+            ))
+        return conditions
+
+    @staticmethod
+    def _filter_date(filters, key):
+        if not filters.get(key):
+            return None
+        try:
+            return date.fromisoformat(filters[key])
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} must be a YYYY-MM-DD date")
+
+    @staticmethod
+    def _escape_like(value):
+        return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+    @staticmethod
+    def _after_cursor(cursor, sort_column, direction):
+        """Rows strictly after the cursor position; NULLs sort first, as in MySQL and SQLite"""
+        try:
+            value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            last_id = int(last_id)
+            if value is not None and sort_column.name == 'transaction_date':
+                # MySQL's DATETIME column comes back as datetime, SQLite's as date
+                value = datetime.fromisoformat(value) if len(value) > 10 else date.fromisoformat(value)
+            elif value is not None and sort_column.name in ('debit_amount', 'credit_amount'):
+                value = Decimal(value)
+        except (TypeError, ValueError, ArithmeticError):
+            raise ValueError('Invalid cursor')
+        id_column = Transactions.__table__.c.id
+
+        if sort_column.name == 'id':
+            return id_column > last_id if direction == 'asc' else id_column < last_id
+        if direction == 'asc':
+            if value is None:
+                return or_(and_(sort_column.is_(None), id_column > last_id), sort_column.isnot(None))
+            return or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+        if value is None:
+            return and_(sort_column.is_(None), id_column < last_id)
+        return or_(sort_column < value, and_(sort_column == value, id_column < last_id), sort_column.is_(None))
+
+    @staticmethod
+    def _encode_cursor(value, last_id):
+        if isinstance(value, date):  # datetime included
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        return base64.urlsafe_b64encode(json.dumps([value, last_id]).encode()).decode()
+
+    @staticmethod
+    def _json_value(field, value):
+        if field in ('debit_amount', 'credit_amount'):
+            return float(value or 0)
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
     def save_product_tags(self, mappings, session_id) -> None:
         """Save product tags uploaded via CSV, updating existing tags or inserting new ones."""
         self.logger.info("Saving uploaded product tags.")
-        new_entries = []
         try:
-            for mapping in mappings:
-                product = mapping['product']
-                tag = mapping['tag']
-                new_entries.append(ProductTag(session_id=session_id, product=product, tag=tag))
-            # Commit changes
-            if new_entries:
-                db.session.bulk_save_objects(new_entries)
-                db.session.commit()
-                current_app.logger.info(f"Inserted {len(new_entries)} new tags.")
+            saved = self.upsert_product_tags(
+                (session_id, mapping['product'], mapping['tag']) for mapping in mappings
+            )
+            if saved:
+                current_app.logger.info(f"Upserted {saved} product tags.")
             else:
                 self.logger.info("No new product tags to insert or update.")
             return {
-                'total_saved': len(new_entries)
+                'total_saved': saved
             }
         except Exception as e:
             current_app.logger.info(f"Error saving product tags: {e}")
@@ -96,27 +337,13 @@ class DatabaseService:
             if not {'SessionID', 'Product', 'Tag'}.issubset(transactions_data.columns):
                 raise ValueError("Missing required columns: SessionID, Product, Tag")
 
-            # Replace NaN with None
-            transactions_data = transactions_data.where(pd.notnull(transactions_data), None)
-
-            # Extract only needed columns
-            product_tags_data = transactions_data[['SessionID', 'Product', 'Tag']].copy()
-            product_tags_data.rename(
-                columns={'SessionID': 'session_id', 'Product': 'product', 'Tag': 'tag'},
-                inplace=True
+            product_tags_data = transactions_data[['SessionID', 'Product', 'Tag']].drop_duplicates(
+                subset=['SessionID', 'Product']
             )
-            product_tags_data.drop_duplicates(subset=['session_id', 'product'], inplace=True)
-
-
-            # Convert to list of dicts
-            product_tags_list = product_tags_data.to_dict(orient='records')
-
-            # Create ProductTag objects
-            product_tags = [ProductTag(**data) for data in product_tags_list]
+            # Replace NaN with None
+            product_tags_data = product_tags_data.astype(object).where(product_tags_data.notna(), None)
 
-            # Bulk insert
-            db.session.bulk_save_objects(product_tags)
-            self.commit_changes()
+            self.upsert_product_tags(product_tags_data.itertuples(index=False, name=None))
             current_app.logger.info("Product tags successfully written.")
 
         except Exception as e:
@@ -125,42 +352,57 @@ class DatabaseService:
 
 
 
+    # DataFrame column -> transactions column
+    TRANSACTION_COLUMNS = {
+        'SessionID': 'session_id',
+        'Date': 'transaction_date',
+        'Narration': 'narration',
+        'Debit Amount': 'debit_amount',
+        'Credit Amount': 'credit_amount',
+        'Product': 'product',
+        'Mode': 'mode',
+        'Tag': 'tag',
+        'Source': 'source',
+        'Filename': 'filename',
+    }
+
     def save_transactions(self, transactions_data: pd.DataFrame) -> None:
-        """Write a DataFrame of transactions to the database."""
+        """Write a DataFrame of transactions to the database.
+
+        Rows are streamed as plain tuples through the driver's executemany
+        in chunks of ``TRANSACTION_INSERT_CHUNK_ROWS`` (PyMySQL sends each
+        chunk as one multi-row INSERT), all inside one transaction. No ORM
+        objects or per-row parameter dicts are built.
+        """
         self.logger.info(f"Writing {len(transactions_data)} transactions to the database.")
+        start = time.perf_counter()
         try:
-            # Convert DataFrame to list of dicts
-            column_mapping = {
-            'SessionID': 'session_id',
-            'Date': 'transaction_date',
-            'Narration': 'narration',
-            'Debit Amount': 'debit_amount',
-            'Credit Amount': 'credit_amount',
-            'Product': 'product',
-            'Mode': 'mode',
-            'Tag': 'tag',
-            'Source': 'source',
-            'Filename': 'filename',
-            }
+            columns = [col for col in transactions_data.columns if col in self.TRANSACTION_COLUMNS]
+            data = transactions_data[columns].rename(columns=self.TRANSACTION_COLUMNS)
+            if 'transaction_date' in data.columns:
+                # ISO strings bind as DATE on every driver without per-row adapters
+                dates = pd.to_datetime(data['transaction_date'], errors='coerce')
+                data['transaction_date'] = dates.dt.strftime('%Y-%m-%d')
 
-            # Rename columns
-            transactions_data.rename(
-                columns={col: column_mapping.get(col, col) for col in transactions_data.columns},
-                inplace=True
+            connection = db.session.connection()
+            marker = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+            insert = (
+                f"INSERT INTO {Transactions.__tablename__} ({', '.join(data.columns)}) "
+                f"VALUES ({', '.join([marker] * len(data.columns))})"
             )
-
-            # Replace all NaNs with None
-            transactions_data = transactions_data.where(pd.notnull(transactions_data), None)
-
-            transactions_data = transactions_data.replace({np.nan: None})
-
-            # Convert to list of dicts
-            transactions_list = transactions_data.to_dict(orient='records')
-            transactions = [Transactions(**data) for data in transactions_list]
-
-            db.session.bulk_save_objects(transactions)
+            chunk_rows = Config.TRANSACTION_INSERT_CHUNK_ROWS
+            for offset in range(0, len(data), chunk_rows):
+                chunk = data.iloc[offset:offset + chunk_rows].astype(object)
+                # NaN/NaT -> NULL
+                chunk = chunk.where(chunk.notna(), None)
+                connection.exec_driver_sql(insert, list(chunk.itertuples(index=False, name=None)))
             self.commit_changes()
-            current_app.logger.info("Transactions successfully written.")
+
+            elapsed = time.perf_counter() - start
+            current_app.logger.info(
+                f"Transactions successfully written: {len(data)} rows in {elapsed:.2f}s "
+                f"({len(data) / elapsed if elapsed else 0:.0f} rows/s)"
+            )
 
         except Exception as e:
             current_app.logger.info(f"Error writing transactions: {e}")
@@ -203,15 +445,41 @@ class DatabaseService:
 
     
     def update_product_tags_in_db(self, batch_suggestions, sessionId):
-        """Updates product tags in the database."""
-        for suggestion in batch_suggestions:
+        """Updates product tags in the database.
+
+        All suggestions are applied in one transaction: per chunk of
+        ``PRODUCT_TAG_UPSERT_CHUNK_ROWS`` products, one UPDATE of
+        product_tags and one of transactions, each setting
+        ``tag = CASE product WHEN ... END`` over the chunk's products. The
+        transactions update covers databases without the
+        update_transactions_tag trigger; where the trigger exists it finds
+        the rows already set.
+        """
+        tags = {}
+        for suggestion in batch_suggestions or []:
             parts = suggestion.split("-")
             if len(parts) != 2:
                 current_app.logger.info(f"Invalid format in suggestion: {suggestion}")
                 continue
 
             product_name, tag = parts
-            query = "UPDATE product_tags SET tag = :tag WHERE product = :product and session_id = :session_id"
-            self.execute_query(query, {"tag": tag, "product": product_name, "session_id": sessionId}) 
-        current_app.logger.info("Successfully executed product tag update")     
+            tags[product_name] = tag
+        if not tags:
+            return
 
+        products = list(tags)
+        chunk_rows = Config.PRODUCT_TAG_UPSERT_CHUNK_ROWS
+        try:
+            for offset in range(0, len(products), chunk_rows):
+                chunk = {product: tags[product] for product in products[offset:offset + chunk_rows]}
+                for table in (ProductTag.__table__, Transactions.__table__):
+                    db.session.execute(
+                        update(table)
+                        .where(table.c.session_id == sessionId, table.c.product.in_(list(chunk)))
+                        .values(tag=case(chunk, value=table.c.product))
+                    )
+            self.commit_changes()
+        except Exception:
+            db.session.rollback()
+            raise
+        current_app.logger.info(f"Successfully executed product tag update for {len(tags)} products")
@@ -14,6 +14,15 @@ class Session(db.Model):
 
 class Transactions(db.Model):
     __tablename__ = 'transactions'  
+    __table_args__ = (
+        db.Index('idx_transactions_session_product', 'session_id', 'product', mysql_length={'product': 255}),
+        # Keyset pages of /edit: filter or sort column, then id as the tie-breaker
+        db.Index('idx_transactions_session_date', 'session_id', 'transaction_date', 'id'),
+        db.Index('idx_transactions_session_tag', 'session_id', 'tag', 'id'),
+        db.Index('idx_transactions_session_mode', 'session_id', 'mode', 'id'),
+        db.Index('idx_transactions_session_debit', 'session_id', 'debit_amount', 'id'),
+        db.Index('idx_transactions_session_credit', 'session_id', 'credit_amount', 'id'),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     session_id = db.Column(db.String(36))
     transaction_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
@@ -41,7 +50,8 @@ class Expense(db.Model):
 
 class ProductTag(db.Model):
     __tablename__ = 'product_tags'
+    __table_args__ = (db.UniqueConstraint('session_id', 'product', name='uq_product_tags_session_product'),)
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(36), db.ForeignKey('sessions.session_id'))
     product = db.Column(db.String(255), nullable=False)
-    tag = db.Column(db.String(255), nullable=False)
\ No newline at end of file
+    tag = db.Column(db.String(255))  # NULL until the product is categorized
\ No newline at end of file
@@ -5,16 +5,24 @@ import os
 from uuid import uuid4
 from werkzeug.utils import secure_filename
 from services.file_loader import FileLoader
-from utils.response_helper import success_response, error_response
+from utils.response_helper import success_response, error_response, ndjson_response
 import numpy as np
 from services.visualization_service import visualization_service
+from services.tag_classifier import tag_classifier
+from services.result_staging import result_staging
+from services.job_queue import job_queue
 import pandas as pd
-from db.models import Transactions, ProductTag
 from services.pdf_processor import PDFProcessor
 from services.excel_processor import ExcelProcessor
 from config import Config
 import boto3
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import hmac
+import json
+import queue
+import threading
 
 main = Blueprint('main', __name__)
 db_service = DatabaseService()
@@ -105,6 +113,169 @@ def health_check():
     return success_response({'status': 'healthy', 'message': 'Backend is running'})
 
 
+def _analyze_file(file_info, session_id, chunk_rows=None):
+    """Process one uploaded file.
+
+    Yields lists of transaction records as they are parsed (at most
+    ``chunk_rows`` each, or one list per loader chunk), then the file's
+    result dict without the transactions. The parsed frames are also staged
+    on the server; the result's ``staged_id`` lets /consolidate-files use
+    them instead of the transactions being sent back.
+    """
+    s3_key = file_info.get('file_path')  # now file_path is the S3 key
+    classification = file_info.get('classification', 'Unknown')
+    filename = file_info.get('filename')
+    password = file_info.get('password')
+
+    if not s3_key:
+        yield {
+            'filename': filename,
+            'status': 'error',
+            'message': 'S3 key not provided'
+        }
+        return
+
+    try:
+        # Download file from S3 into memory
+        file_obj = BytesIO()
+        s3_client.download_fileobj(BUCKET_NAME, s3_key, file_obj)
+        file_obj.seek(0)  # reset pointer to start
+
+        # Process based on file type, one bounded chunk at a time
+        file_loader = FileLoader()
+        transaction_count = 0
+        unparsed_dates = 0
+        parse_stats = None
+        with result_staging.writer(session_id, s3_key) as staged:
+            for df in file_loader.parse_chunks(file_obj, password, filename):
+                unparsed_dates += df.attrs.get('unparsed_dates', 0)
+                # Set once per file (PDFs) and carried onto every chunk
+                parse_stats = df.attrs.get('parse_stats', parse_stats)
+                df['Source'] = classification
+                staged.write(df)
+
+                # Convert DataFrame to dict for JSON response
+                df.replace({np.nan: None, np.inf: None, -np.inf: None}, inplace=True)
+                step = chunk_rows or max(len(df), 1)
+                for start in range(0, len(df), step):
+                    records = df.iloc[start:start + step].to_dict('records')
+                    transaction_count += len(records)
+                    yield records
+        current_app.logger.info(f"Transactions processed successfully")
+        if unparsed_dates:
+            current_app.logger.info(f"{unparsed_dates} dates could not be parsed in {filename}")
+
+        result = {
+            'filename': filename,
+            'status': 'success',
+            'classification': classification,
+            'transaction_count': transaction_count,
+            'total_transactions': transaction_count,
+            'unparsed_dates': unparsed_dates,
+            'staged_id': staged.staged_id
+        }
+        if parse_stats:
+            result['parse_stats'] = parse_stats
+        yield result
+
+    except Exception as file_error:
+        error_message = str(file_error)
+        if 'password' in error_message.lower() or 'encrypted' in error_message.lower():
+            yield {
+                'filename': filename,
+                'status': 'error',
+                'message': 'Invalid password or password required',
+                'password_required': True
+            }
+        else:
+            yield {
+                'filename': filename,
+                'status': 'error',
+                'message': error_message
+            }
+
+
+_FILE_DONE = object()
+
+
+def _analyze_files_concurrently(files_data, session_id, chunk_rows=None):
+    """Yield (file index, item) for every item ``_analyze_file`` produces, running files concurrently.
+
+    Each file gets a worker thread for its S3 download and processing (CSV
+    and Excel parsing may move on to a process, see
+    ``FileLoader.parse_chunks``), with at most ``ANALYZE_MAX_WORKERS`` files
+    at once. Items arrive as they are ready, so files interleave. A bounded
+    queue keeps fast files from running far ahead of the consumer, and
+    closing the generator stops the workers.
+    """
+    if not files_data:
+        return
+    app = current_app._get_current_object()
+    workers = max(1, min(Config.ANALYZE_MAX_WORKERS, len(files_data)))
+    items = queue.Queue(maxsize=workers * 2)
+    cancelled = threading.Event()
+
+    def put(item):
+        while not cancelled.is_set():
+            try:
+                items.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run(index, file_info):
+        with app.app_context():
+            try:
+                for item in _analyze_file(file_info, session_id, chunk_rows):
+                    if not put((index, item)):
+                        return
+            except Exception as e:
+                # _analyze_file reports file errors itself; this only catches the unexpected
+                put((index, {'filename': file_info.get('filename'), 'status': 'error', 'message': str(e)}))
+            finally:
+                put((index, _FILE_DONE))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for index, file_info in enumerate(files_data):
+            executor.submit(run, index, file_info)
+        try:
+            remaining = len(files_data)
+            while remaining:
+                index, item = items.get()
+                if item is _FILE_DONE:
+                    remaining -= 1
+                else:
+                    yield index, item
+        finally:
+            cancelled.set()
+
+
+def _analysis_stream(files_data, session_id):
+    """NDJSON records for /analyze: transaction chunks and a result per file, then a closing record.
+
+    Files are processed concurrently, so their records interleave; each one
+    carries the file's position in the request (``file_index``) and S3 key,
+    since two uploads may share a filename.
+    """
+    try:
+        for index, item in _analyze_files_concurrently(files_data, session_id, Config.ANALYZE_STREAM_CHUNK_ROWS):
+            file = {'file_index': index, 'file_path': files_data[index].get('file_path')}
+            if isinstance(item, list):
+                yield {'type': 'transactions', 'filename': files_data[index].get('filename'), **file, 'transactions': item}
+            else:
+                yield {'type': 'result', **item, **file}
+        yield {'type': 'done', 'message': 'Analysis completed', 'file_count': len(files_data)}
+    except Exception as e:
+        # Headers are already sent, so the failure has to travel in the stream
+        current_app.logger.error(f'Analysis failed: {str(e)}')
+        yield {'type': 'error', 'error': f'Analysis failed: {str(e)}'}
+
+
+def _wants_stream(data):
+    return bool(data.get('stream')) or 'application/x-ndjson' in request.headers.get('Accept', '')
+
+
 @main.route('/analyze', methods=['POST'])
 def analyze_files():
     try:
@@ -116,62 +287,20 @@ def analyze_files():
         session_id = data['session_id']
         db_service.save_session_if_not_exists(session_id)
 
-        results = []
-
-        for file_info in files_data:
-            s3_key = file_info.get('file_path')  # now file_path is the S3 key
-            classification = file_info.get('classification', 'Unknown')
-            filename = file_info.get('filename')
-            password = file_info.get('password')
-
-            if not s3_key:
-                results.append({
-                    'filename': filename,
-                    'status': 'error',
-                    'message': 'S3 key not provided'
-                })
-                continue
-
-            try:
-                # Download file from S3 into memory
-                file_obj = BytesIO()
-                s3_client.download_fileobj(BUCKET_NAME, s3_key, file_obj)
-                file_obj.seek(0)  # reset pointer to start
-
-                # Process based on file type
-                file_loader = FileLoader()
-                df = file_loader.load(file_obj, password, filename)
-                df['Source'] = classification
-
-                # Convert DataFrame to dict for JSON response
-                df.replace({np.nan: None, np.inf: None, -np.inf: None}, inplace=True)
-                transactions = df.to_dict('records')
-                current_app.logger.info(f"Transactions processed successfully")
-
-                results.append({
-                    'filename': filename,
-                    'status': 'success',
-                    'classification': classification,
-                    'transaction_count': len(transactions),
-                    'transactions': transactions,
-                    'total_transactions': len(transactions)
-                })
-
-            except Exception as file_error:
-                error_message = str(file_error)
-                if 'password' in error_message.lower() or 'encrypted' in error_message.lower():
-                    results.append({
-                        'filename': filename,
-                        'status': 'error',
-                        'message': 'Invalid password or password required',
-                        'password_required': True
-                    })
-                else:
-                    results.append({
-                        'filename': filename,
-                        'status': 'error',
-                        'message': error_message
-                    })
+        # Streaming mode: one NDJSON line per transaction chunk and per file result, sent as each is ready
+        if _wants_stream(data):
+            return ndjson_response(_analysis_stream(files_data, session_id))
+
+        transactions = [[] for _ in files_data]
+        results = [None] * len(files_data)
+        for index, item in _analyze_files_concurrently(files_data, session_id):
+            if isinstance(item, list):
+                transactions[index].extend(item)
+            else:
+                results[index] = item
+        for result, file_transactions in zip(results, transactions):
+            if result['status'] == 'success':
+                result['transactions'] = file_transactions
 
         return success_response({
             'message': 'Analysis completed',
@@ -300,6 +429,23 @@ def download_consolidate_files():
         current_app.logger.error(f'Failed to consolidate files: {str(e)}')
         return error_response(f'Failed to consolidate files: {str(e)}', 500)
     
+def _categorize_session(session_id, job=None):
+    """Ask the tagging pipeline for the session's untagged products and store the tags"""
+    current_app.logger.info(f'Categorizing session {session_id} with AI')
+    empty_products = db_service.get_empty_products(session_id)
+    if job:
+        job.report({'stage': 'categorizing', 'products': len(empty_products)}, force=True)
+    result = visualization_service.categorize_transactions(
+        empty_products = empty_products,
+        session_id = session_id
+    )
+    if job:
+        job.check_cancelled()
+        job.report({'stage': 'saving', 'products': len(empty_products)}, force=True)
+    db_service.update_product_tags_in_db(result, session_id)
+    return len(empty_products)
+
+
 @main.route('/categorize-expenses', methods=['POST'])
 def categorize_expenses():
     """Map product tags to transaction data with optional AI categorization"""
@@ -313,13 +459,7 @@ def categorize_expenses():
         session_id = data['session_id']
     
         if use_ai:
-            current_app.logger.info(f'Use AI set to : {str(use_ai)}')
-            session_id = data['session_id']
-            empty_products = db_service.get_empty_products(session_id)
-            result = visualization_service.categorize_transactions(
-                empty_products = empty_products
-            )
-            db_service.update_product_tags_in_db(result, session_id)
+            _categorize_session(session_id)
         
         return success_response({
             'message': 'Expense categorization completed',
@@ -337,21 +477,23 @@ def get_transactions():
         if not session_id:
             return jsonify({'success': False, 'error': 'Session ID is required'}), 400
 
-        transactions = Transactions.query.filter_by(session_id=session_id).all()
+        rows, next_cursor = db_service.get_transactions_page(
+            session_id,
+            filters=request.json.get('filters'),
+            sort=request.json.get('sort'),
+            direction=request.json.get('direction', 'asc'),
+            limit=request.json.get('limit'),
+            cursor=request.json.get('cursor'),
+            fields=request.json.get('fields'),
+        )
 
         return jsonify({
             'success': True,
-            'data': [{
-                'id': t.id,
-                'date': t.transaction_date.isoformat() if t.transaction_date else None,
-                'narration': t.narration,
-                'product': t.product,
-                'debit_amount': float(t.debit_amount or 0),
-                'credit_amount': float(t.credit_amount or 0),
-                'tag': t.tag,
-                'mode': t.mode
-            } for t in transactions]
+            'data': rows,
+            'next_cursor': next_cursor,
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f'Failed to edit: {str(e)}')
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -369,24 +511,10 @@ def update_product():
 
     try:
         if replace_all:
-            # Update all products in ProductTag
-            product_tags_to_update = ProductTag.query.filter_by(session_id=session_id, product=old_product).all()
-            for product_tag in product_tags_to_update:
-                product_tag.product = new_product
-
-            # Update all products in Transactions
-            expenses_to_update = Transactions.query.filter_by(session_id=session_id, product=old_product).all()
-            for expense in expenses_to_update:
-                expense.product = new_product
+            db_service.rename_product(session_id, old_product, new_product)
         else:
-            # Add new ProductTag
-            new_product_tag = ProductTag(session_id=session_id, product=new_product, tag=tag)
-            expense = Transactions.query.filter_by(id=transaction_id).first()
-            if expense:
-                expense.product = new_product
-            db_service._commit(new_product_tag)
-
-        db_service.commit_changes()
+            db_service.rename_transaction_product(transaction_id, session_id, new_product, tag)
+
         return jsonify({'success': True, 'message': 'Product updated successfully'}), 200
     except Exception as e:
         current_app.logger.error(f'Error in product update: {str(e)}')
@@ -401,20 +529,11 @@ def update_transaction_tag():
         product = data.get('product')
         new_tag = data.get('newTag')
 
-        # Update or insert ProductTag
-        existing_entry = ProductTag.query.filter_by(session_id=session_id, product=product).first()
-        if existing_entry:
-            existing_entry.tag = new_tag
-        else:
-            new_entry = ProductTag(session_id=session_id, product=product, tag=new_tag)
-            db_service._commit(new_entry)
-        
-        # Update transactions
-        expenses_to_update = Transactions.query.filter_by(session_id=session_id, product=product).all()
-        for expense in expenses_to_update:
-            expense.tag = new_tag
+        # Update or insert ProductTag, then the transactions it covers
+        db_service.set_product_tag(session_id, product, new_tag)
 
-        db_service.commit_changes()
+        # Corrections become training data for the local tag classifier
+        tag_classifier.record_correction(product, new_tag, db_service.get_average_debit(session_id, product))
         return jsonify({'success': True, 'message': 'Tag updated successfully'}), 200
     except Exception as e:
         current_app.logger.error(f'Error in tag update : {str(e)}')
@@ -470,4 +589,153 @@ def generate_upload_urls():
             "is_password_protected": False,
         })
 
-    return jsonify({"urls": presigned_urls})
\ No newline at end of file
+    return jsonify({"urls": presigned_urls})
+
+
+def _run_analyze_job(job, payload):
+    """Job handler for /jobs/analyze: same work as /analyze, with per-file progress"""
+    files_data = payload['files']
+    progress = {
+        'completed': 0,
+        'total': len(files_data),
+        'files': [
+            {'file_index': index, 'file_path': f.get('file_path'), 'filename': f.get('filename'),
+             'status': 'pending', 'transactions': 0}
+            for index, f in enumerate(files_data)
+        ],
+    }
+    job.report(progress, force=True)
+    results = [None] * len(files_data)
+    items = _analyze_files_concurrently(files_data, job.session_id)
+    try:
+        for index, item in items:
+            job.check_cancelled()
+            file_progress = progress['files'][index]
+            if isinstance(item, list):
+                file_progress['status'] = 'processing'
+                file_progress['transactions'] += len(item)
+                job.report(progress)
+            else:
+                results[index] = item
+                file_progress['status'] = item['status']
+                progress['completed'] += 1
+                job.report(progress, force=True)
+    finally:
+        # Stops the remaining file workers when the job is cancelled
+        items.close()
+    return {'message': 'Analysis completed', 'results': results}
+
+
+def _run_categorize_job(job, payload):
+    """Job handler for /jobs/categorize"""
+    products = _categorize_session(job.session_id, job) if payload.get('use_ai') else 0
+    return {'message': 'Expense categorization completed', 'products': products}
+
+
+job_queue.register('analyze', _run_analyze_job)
+job_queue.register('categorize', _run_categorize_job)
+
+
+def _reusable_analysis(session_id, result):
+    """Whether a finished analyze job can be handed out again.
+
+    Only when every file parsed and its staged result is still on the
+    server; a job with any failed file (wrong password, S3 error) is rerun.
+    """
+    file_results = (result or {}).get('results') or []
+    return bool(file_results) and all(
+        file_result
+        and file_result.get('status') == 'success'
+        and file_result.get('staged_id')
+        and result_staging.exists(session_id, file_result['staged_id'])
+        for file_result in file_results
+    )
+
+
+def _password_digest(password):
+    """Keyed digest of a file password for dedupe keys, so the password itself is never stored"""
+    if not password:
+        return None
+    return hmac.new((Config.SECRET_KEY or '').encode('utf-8'), password.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def _dedupe_key(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+@main.route('/jobs/analyze', methods=['POST'])
+def submit_analyze_job():
+    """Queue /analyze work; resubmitting the same files and passwords returns the job already queued or fully parsed"""
+    data = request.get_json()
+    if not data or 'files' not in data or not data.get('session_id'):
+        return error_response('Files data and session_id are required', 400)
+    session_id = data['session_id']
+    try:
+        db_service.save_session_if_not_exists(session_id)
+        # The password is part of the key, so retrying with the right one starts a new job
+        dedupe_key = _dedupe_key('analyze', session_id, sorted(
+            [f.get('file_path') or '', f.get('classification', 'Unknown'), _password_digest(f.get('password'))]
+            for f in data['files']
+        ))
+        job_id, deduplicated = job_queue.submit(
+            'analyze', session_id, {'files': data['files']}, dedupe_key=dedupe_key,
+            reuse_succeeded=lambda result: _reusable_analysis(session_id, result)
+        )
+        return success_response({'job_id': job_id, 'deduplicated': deduplicated}, 202)
+    except Exception as e:
+        current_app.logger.error(f'Failed to queue analysis: {str(e)}')
+        return error_response(f'Failed to queue analysis: {str(e)}', 500)
+
+
+@main.route('/jobs/categorize', methods=['POST'])
+def submit_categorize_job():
+    """Queue /categorize-expenses work"""
+    data = request.get_json()
+    if not data or not data.get('session_id'):
+        return error_response('Data and session_id are required', 400)
+    session_id = data['session_id']
+    use_ai = bool(data.get('use_ai', False))
+    try:
+        job_id, deduplicated = job_queue.submit(
+            'categorize', session_id, {'use_ai': use_ai},
+            dedupe_key=_dedupe_key('categorize', session_id, use_ai), reuse_succeeded=False
+        )
+        return success_response({'job_id': job_id, 'deduplicated': deduplicated}, 202)
+    except Exception as e:
+        current_app.logger.error(f'Failed to queue categorization: {str(e)}')
+        return error_response(f'Failed to queue categorization: {str(e)}', 500)
+
+
+def _session_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None or job['session_id'] != request.args.get('session_id'):
+        return None
+    return job
+
+
+@main.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Job status, progress and result; ?transactions=1 adds finished files' parsed transactions"""
+    try:
+        job = _session_job(job_id)
+        if job is None:
+            return error_response('Job not found', 404)
+        if job['kind'] == 'analyze' and job['result'] and request.args.get('transactions'):
+            for result in job['result']['results']:
+                if result.get('status') == 'success' and result.get('staged_id'):
+                    df = result_staging.load(job['session_id'], result['staged_id'])
+                    df.replace({np.nan: None, np.inf: None, -np.inf: None}, inplace=True)
+                    result['transactions'] = df.to_dict('records')
+        return success_response(job)
+    except Exception as e:
+        current_app.logger.error(f'Failed to read job {job_id}: {str(e)}')
+        return error_response(f'Failed to read job: {str(e)}', 500)
+
+
+@main.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    if _session_job(job_id) is None:
+        return error_response('Job not found', 404)
+    if not job_queue.cancel(job_id):
+        return error_response('Job has already finished', 409)
+    return success_response({'job_id': job_id, 'status': 'cancelled'})
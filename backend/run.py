@@ -7,6 +7,8 @@ from config import Config
 from db.db_handler import DatabaseService
 from db.models import db
 from routes import main
+from services.tag_classifier import tag_classifier
+from services.job_queue import job_queue
 from flask_cors import CORS
 import boto3
 
@@ -44,6 +46,12 @@ app.logger.addHandler(console_handler)
 app.logger.setLevel(logging.DEBUG)
 app.logger.info("Flask application started with console logging.")
 
+# Train the offline tag classifier now rather than on the first request
+tag_classifier.load()
+
+# Background jobs run inside this app's context
+job_queue.init_app(app)
+
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8000)
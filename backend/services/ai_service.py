@@ -1,33 +1,109 @@
 import logging
-import openai 
 from flask import current_app
 from config import Config
+from services.llm_client import llm_client
+from services.tag_cache import tag_cache
+from services.tag_classifier import tag_classifier
 
 
 # Initialize logger
 logger = logging.getLogger(__name__)
 
 class AIService:
-    def __init__(self):
-        openai.api_key = Config.OPENAI_API_KEY
+    TAGS = ["Rent", "Bills", "Groceries", "Services", "Shopping", "Contact", "Investments",
+            "Travel", "Dineout", "Food", "Fun", "TBD"]
 
+    def get_tag_suggestions(self, products_with_amounts, session_id=None):
+        """Return "Product-Tag" suggestions.
 
-    def get_tag_suggestions(self, products_with_amounts):
+        Products are answered from ``tag_cache`` first (scoped to
+        ``session_id`` unless the cache is shared), then by the local
+        ``tag_classifier`` when it is confident; only the rest go to the model.
+        """
         results = []
         unmatched_products = []
 
-        limited_products = products_with_amounts[:100]
-
-        # Directly process batched input
-        for item in limited_products:
-            product = item["product"]
-            amount = item["avg_spend"]
-            unmatched_products.append((product, amount))
+        products_with_amounts = products_with_amounts or []
+        keys = [tag_cache.key(item["product"], item["avg_spend"], session_id) for item in products_with_amounts]
+        cached_tags = tag_cache.get_many(keys)
+        miss_keys = {}
+        for item, key in zip(products_with_amounts, keys):
+            if key in cached_tags:
+                results.append(f"{item['product']}-{cached_tags[key]}")
+            else:
+                miss_keys[str(item["product"]).strip()] = key
+                unmatched_products.append((item["product"], item["avg_spend"]))
+
+        escalated = []
+        for (product, amount), (tag, confidence) in zip(unmatched_products, tag_classifier.predict(unmatched_products)):
+            if tag in self.TAGS and confidence >= Config.TAG_CLASSIFIER_MIN_CONFIDENCE:
+                results.append(f"{product}-{tag}")
+            else:
+                escalated.append((product, amount))
+
+        current_app.logger.info(
+            f"Tag cache answered {len(products_with_amounts) - len(miss_keys)} products, "
+            f"local classifier {len(unmatched_products) - len(escalated)}, "
+            f"asking the model for {len(escalated)}"
+        )
+        unmatched_products = escalated
+
+        if not unmatched_products:
+            if products_with_amounts:
+                tag_cache.record_avoided_request()
+            return results
+
+        batches = self._token_batches(unmatched_products)
+        replies = llm_client.complete_many(
+            [self._tag_prompt(batch) for batch in batches],
+            model="gpt-3.5-turbo",
+            temperature=0.5,
+            timeout=Config.TAG_BATCH_TIMEOUT,
+        )
+
+        new_tags = {}
+        for batch, reply in zip(batches, replies):
+            if isinstance(reply, Exception):
+                current_app.logger.error(f"AI batch of {len(batch)} products failed: {reply!r}")
+                continue
+            try:
+                # Clean and validate each suggestion
+                for suggestion in reply.split("\n"):
+                    suggestion = suggestion.strip('- ').strip()  # Remove any leading/trailing dashes and spaces
+                    if '-' in suggestion:
+                        product, tag = suggestion.split('-', 1)
+                        clean_suggestion = f"{product.strip()}-{tag.strip()}"
+                        results.append(clean_suggestion)
+                        if product.strip() in miss_keys and tag.strip() in self.TAGS:
+                            new_tags[miss_keys[product.strip()]] = tag.strip()
+            except Exception as e:
+                current_app.logger.error(f"Error in AI response: {e}")
+        tag_cache.put_many(new_tags)
 
-        if unmatched_products:
-            formatted_inputs = [f"{p}: {a}" for p, a in unmatched_products]
+        current_app.logger.info(f"AI classified {len(batches)} batches: {results}")
+        current_app.logger.info(f"Tag cache stats: {tag_cache.stats()}")
+        return results
 
-            prompt = f"""
+    @staticmethod
+    def _token_batches(products):
+        """Split (product, amount) pairs into batches of at most ``TAG_BATCH_TOKENS`` prompt tokens"""
+        batches, batch, used = [], [], 0
+        for product, amount in products:
+            tokens = len(f"{product}: {amount}, ") // llm_client.CHARS_PER_TOKEN + 1
+            if batch and used + tokens > Config.TAG_BATCH_TOKENS:
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append((product, amount))
+            used += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _tag_prompt(batch):
+        formatted_inputs = [f"{p}: {a}" for p, a in batch]
+
+        return f"""
                 Task: Categorize each product into one of these tags:
                 Rent, Bills, Groceries, Services, Shopping, Contact, Investments, Travel, Dineout, Food, Fun, TBD.
 
@@ -42,27 +118,6 @@ class AIService:
                 Respond with ONLY product-tag pairs, one per line, exactly like this format:
                 ProductName-Tag
                 """
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.5
-            )
-
-            try:
-                # Clean and validate each suggestion
-                suggestions = response.choices[0].message.content.strip().split("\n")
-                for suggestion in suggestions:
-                    suggestion = suggestion.strip('- ').strip()  # Remove any leading/trailing dashes and spaces
-                    if '-' in suggestion:
-                        product, tag = suggestion.split('-', 1)
-                        clean_suggestion = f"{product.strip()}-{tag.strip()}"
-                        results.append(clean_suggestion)
-                
-                current_app.logger.info(f"AI classified batch: {results}")
-
-            except Exception as e:
-                current_app.logger.error(f"Error in AI response: {e}")
-        return results
 
 
 # Initialize AI Service instance
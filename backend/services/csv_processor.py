@@ -1,17 +1,35 @@
 import pandas as pd
 from io import BytesIO
+from config import Config
+from services.reader_engines import resolve_csv_engine, DEFAULT_CSV_ENGINE
 
 class CSVProcessor:
+    def __init__(self, engine=None):
+        self.engine = resolve_csv_engine(engine or Config.CSV_READER_ENGINE)
+
     def is_password_protected(self, file):
         return False  # CSVs can't be password protected
 
     def load(self, file, password=None):
         if isinstance(file, str):  # S3 path or local path
-            return pd.read_csv(file)
+            return pd.read_csv(file, engine=self.engine)
         elif isinstance(file, bytes):  # raw bytes → wrap in BytesIO
-            return pd.read_csv(BytesIO(file))
+            return pd.read_csv(BytesIO(file), engine=self.engine)
         elif isinstance(file, BytesIO):  # already BytesIO
             file.seek(0)
-            return pd.read_csv(file)
+            return pd.read_csv(file, engine=self.engine)
         else:
             raise ValueError(f"Unsupported file type for CSVProcessor: {type(file)}")
+
+    def iter_chunks(self, file, password=None, chunksize=50000):
+        """Yield the CSV as DataFrames of at most ``chunksize`` rows"""
+        if isinstance(file, bytes):
+            file = BytesIO(file)
+        elif isinstance(file, BytesIO):
+            file.seek(0)
+        elif not isinstance(file, str) and not hasattr(file, 'read'):
+            raise ValueError(f"Unsupported file type for CSVProcessor: {type(file)}")
+
+        # pyarrow cannot read in chunks, so streaming always uses the C parser
+        with pd.read_csv(file, chunksize=chunksize, engine=DEFAULT_CSV_ENGINE) as reader:
+            yield from reader
@@ -0,0 +1,90 @@
+import pandas as pd
+
+
+class DateNormalizer:
+    """Normalize a statement's date column to 'YYYY-MM-DD' strings.
+
+    The format is inferred once from a sample of the column and the whole
+    column is then parsed in one vectorized ``pd.to_datetime`` call. Only
+    the cells that do not fit the inferred format are parsed one by one.
+    """
+
+    # Indian bank statements are day-first, so those formats win ties
+    CANDIDATE_FORMATS = [
+        "%d/%m/%y", "%d/%m/%Y", "%d-%m-%y", "%d-%m-%Y", "%d.%m.%y", "%d.%m.%Y",
+        "%d-%b-%y", "%d-%b-%Y", "%d %b %y", "%d %b %Y", "%d/%b/%Y",
+        "%Y-%m-%d", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S",
+        "%d/%m/%Y %H:%M:%S", "%d/%m/%y %H:%M", "%d-%m-%Y %H:%M:%S",
+        "%m/%d/%y", "%m/%d/%Y",
+    ]
+    SAMPLE_SIZE = 200
+
+    def infer_format(self, values: pd.Series):
+        """Return the candidate format that parses most of a sample, or None"""
+        sample = self._as_text(values).dropna()
+        sample = sample[sample != ""].head(self.SAMPLE_SIZE)
+        if sample.empty:
+            return None
+
+        best_format, best_count = None, 0
+        for date_format in self.CANDIDATE_FORMATS:
+            count = pd.to_datetime(sample, format=date_format, errors="coerce").notna().sum()
+            if count > best_count:
+                best_format, best_count = date_format, count
+                if count == len(sample):
+                    break
+        return best_format
+
+    def normalize(self, values: pd.Series, date_format: str = None):
+        """Parse ``values``; returns (dates, date_format, unparsed_count).
+
+        ``dates`` holds 'YYYY-MM-DD' strings, or None where a value is empty
+        or could not be parsed. ``unparsed_count`` counts the non-empty
+        values that could not be parsed.
+        """
+        if pd.api.types.is_datetime64_any_dtype(values):
+            parsed = values
+            present = values.notna()
+        else:
+            text = self._as_text(values)
+            present = text.notna() & (text != "")
+            if date_format is None:
+                date_format = self.infer_format(text)
+
+            if date_format is not None:
+                parsed = pd.to_datetime(text, format=date_format, errors="coerce")
+            else:
+                parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+
+            # Row-wise fallback only for the cells the format did not fit
+            failed = present & parsed.isna()
+            if failed.any():
+                dayfirst = date_format is None or date_format.startswith("%d")
+                parsed = parsed.copy()
+                parsed[failed] = pd.to_datetime(
+                    values[failed].map(lambda value: parse_date(value, dayfirst)), errors="coerce"
+                )
+
+        dates = parsed.to_numpy(dtype="datetime64[D]").astype(str).astype(object)
+        dates[parsed.isna().to_numpy()] = None
+        unparsed = int((present & parsed.isna()).sum())
+        return pd.Series(dates, index=values.index, dtype=object), date_format, unparsed
+
+    @staticmethod
+    def _as_text(values: pd.Series) -> pd.Series:
+        if values.dtype != object or pd.api.types.infer_dtype(values, skipna=True) not in ("string", "mixed"):
+            return values
+        stripped = values.str.strip()
+        # Non-string cells (e.g. datetimes from Excel) come back as NaN; keep them
+        return stripped.where(stripped.notna(), values)
+
+
+def parse_date(value, dayfirst=True):
+    """Parse a single date with format guessing; None when it cannot be parsed."""
+    try:
+        return pd.to_datetime(value, dayfirst=dayfirst)
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+date_normalizer = DateNormalizer()
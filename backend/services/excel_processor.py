@@ -1,26 +1,53 @@
 import pandas as pd
+import numpy as np
 import msoffcrypto
+import olefile
 import io
+from config import Config
+from services.reader_engines import resolve_excel_engine, DEFAULT_EXCEL_ENGINE
+from services.layout_registry import layout_registry
 
 class ExcelProcessor:
-    def __init__(self):
+    def __init__(self, engine=None):
         self.decrypted_stream = None  # Used to reuse decrypted content if needed
+        engine = resolve_excel_engine(engine or Config.EXCEL_READER_ENGINE)
+        # Leave the default to pandas so it can still pick a reader by file format
+        self.engine = None if engine == DEFAULT_EXCEL_ENGINE else engine
 
-    def is_password_protected(self, file_bytes: bytes) -> bool:
-        """Check if an Excel file is password-protected"""
+    OLE_MAGIC = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+    ZIP_MAGIC = b'PK\x03\x04'
+
+    def is_password_protected(self, file_bytes) -> bool:
+        """Check if an Excel file is password-protected without decrypting it.
+
+        A plain .xlsx is a ZIP archive, while an encrypted one is wrapped in an
+        OLE compound file with an EncryptionInfo stream, so the first bytes and
+        the OLE directory are enough. Legacy .xls files are OLE either way and
+        are checked for a FILEPASS record by msoffcrypto, which only reads the
+        start of the workbook stream.
+        """
         try:
-            file_like = io.BytesIO(file_bytes)
-            office_file = msoffcrypto.OfficeFile(file_like)
-            office_file.load_key(password=None)
-            decrypted = io.BytesIO()
-            office_file.decrypt(decrypted)
-            pd.read_excel(decrypted)
-            return False
-        except msoffcrypto.exceptions.InvalidKeyError:
-            return True
+            if isinstance(file_bytes, str):
+                with open(file_bytes, 'rb') as f:
+                    return self._sniff_encryption(f)
+            if isinstance(file_bytes, bytes):
+                file_bytes = io.BytesIO(file_bytes)
+            return self._sniff_encryption(file_bytes)
         except Exception:
             return False  # Other errors treated as not password-protected
 
+    def _sniff_encryption(self, file_like) -> bool:
+        file_like.seek(0)
+        magic = file_like.read(len(self.OLE_MAGIC))
+        file_like.seek(0)
+        if magic.startswith(self.ZIP_MAGIC) or magic != self.OLE_MAGIC:
+            return False
+        # Not closed on purpose: closing an OleFileIO closes the caller's stream
+        if olefile.OleFileIO(file_like).exists('EncryptionInfo'):
+            return True
+        file_like.seek(0)
+        return msoffcrypto.OfficeFile(file_like).is_encrypted()
+
     def _decrypt_excel(self, file_bytes: bytes, password: str):
         """Decrypts an Excel file and stores the decrypted stream"""
         file_like = io.BytesIO(file_bytes)
@@ -33,36 +60,78 @@ class ExcelProcessor:
 
     def find_data_start(self, df, min_consecutive_rows=3, min_non_empty_cols=4):
         """Finds the first row where the actual transaction table starts"""
-        for i in range(len(df) - min_consecutive_rows):
-            block = df.iloc[i:i+min_consecutive_rows]
-            valid_rows = block.apply(lambda row: row.count() >= min_non_empty_cols, axis=1)
-            if valid_rows.all():
-                return i
-        return -1
+        wide = (df.notna().sum(axis=1).to_numpy() >= min_non_empty_cols).astype(np.int64)
+        if len(wide) < min_consecutive_rows:
+            return -1
+        # Number of wide rows in each window of min_consecutive_rows rows
+        window_counts = np.convolve(wide, np.ones(min_consecutive_rows, dtype=np.int64), mode='valid')
+        starts = (window_counts == min_consecutive_rows).nonzero()[0]
+        return int(starts[0]) if len(starts) else -1
+
+    def _frame_from_start(self, df_raw, start_row):
+        """Use row ``start_row`` of the raw sheet as the header and the rows below as data"""
+        columns = []
+        seen = {}
+        for i, cell in enumerate(df_raw.iloc[start_row]):
+            name = f"Unnamed: {i}" if pd.isna(cell) else cell
+            # Mangle duplicates the way read_excel does (Amount, Amount.1, ...)
+            if name in seen:
+                seen[name] += 1
+                name = f"{name}.{seen[name]}"
+            else:
+                seen[name] = 0
+            columns.append(name)
+
+        df = df_raw.iloc[start_row + 1:].reset_index(drop=True)
+        df.columns = columns
+        # Header/preamble text made every column object dtype; re-infer from the data rows
+        return df.infer_objects()
+
+    def layout_fingerprint(self, df_raw, min_non_empty_cols=4):
+        """Fingerprint the header row and the preamble above it.
+
+        The header is taken to be the first row with at least
+        ``min_non_empty_cols`` values; the preamble is the non-empty cell count
+        of every row above it, which stays the same from one export to the next.
+        """
+        counts = df_raw.notna().sum(axis=1).to_numpy()
+        wide_rows = (counts >= min_non_empty_cols).nonzero()[0]
+        header_row = int(wide_rows[0]) if len(wide_rows) else 0
+        header_cells = df_raw.iloc[header_row].dropna().tolist() if len(df_raw) else []
+        return layout_registry.fingerprint(header_cells, counts[:header_row])
 
     def load(self, file_bytes: bytes, password: str = None):
-        """Loads the decrypted Excel into a DataFrame from memory (not disk)"""
+        """Loads the decrypted Excel into a DataFrame from memory (not disk).
+
+        The sheet is parsed once without a header; the table start is found
+        on that frame and the header is built by slicing it, rather than
+        parsing the workbook a second time with ``skiprows``.
+        """
         try:
             if password:
                 self._decrypt_excel(file_bytes, password)
-                df_raw = pd.read_excel(self.decrypted_stream, header=None)
+                df_raw = pd.read_excel(self.decrypted_stream, header=None, engine=self.engine)
             else:
-                df_raw = pd.read_excel(io.BytesIO(file_bytes), header=None)
+                df_raw = pd.read_excel(io.BytesIO(file_bytes), header=None, engine=self.engine)
         except Exception as e:
             raise ValueError(f"Failed to open Excel file: {e}")
 
-        start_row = self.find_data_start(df_raw)
-        if start_row == -1:
-            raise ValueError("Could not find the start of the transaction table.")
+        fingerprint = self.layout_fingerprint(df_raw)
+        layout = layout_registry.get(fingerprint)
+        if layout is not None:
+            start_row = layout['skiprows']
+        else:
+            start_row = self.find_data_start(df_raw)
+            if start_row == -1:
+                raise ValueError("Could not find the start of the transaction table.")
 
         try:
-            if password:
-                self.decrypted_stream.seek(0)
-                df = pd.read_excel(self.decrypted_stream, skiprows=start_row)
-            else:
-                df = pd.read_excel(io.BytesIO(file_bytes), skiprows=start_row)
+            df = self._frame_from_start(df_raw, start_row)
         except Exception as e:
             raise ValueError(f"Failed to parse Excel content: {e}")
 
         df = df.dropna(how='all')
+        # FileLoader finishes resolving the layout (columns, date format) under this key
+        df.attrs['layout_fingerprint'] = fingerprint
+        df.attrs['skiprows'] = start_row
         return df
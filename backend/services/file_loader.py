@@ -1,11 +1,54 @@
 from services.csv_processor import CSVProcessor
 from services.excel_processor import ExcelProcessor
 from services.pdf_processor import PDFProcessor
+from services.date_parser import date_normalizer
+from services.layout_registry import layout_registry
+from config import Config
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import logging
+import multiprocessing
+import threading
 import pandas as pd
 import os 
 import re
 
+logger = logging.getLogger(__name__)
+
+
+def _parse_chunks(data: bytes, password: str, filename: str, chunksize: int):
+    """Worker task: every standardized chunk of an uploaded file"""
+    return list(FileLoader().iter_chunks(BytesIO(data), password, filename, chunksize))
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Shared pool of ``ANALYZE_PARSE_WORKERS`` spawned processes for CSV / Excel parsing"""
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=Config.ANALYZE_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _parse_pool
+
+
+def _discard_parse_pool(pool: ProcessPoolExecutor):
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
 class FileLoader:
+    # Parsing these is pure CPU work; PDFs mostly wait on the LLM and log through the app context
+    PROCESS_PARSED_TYPES = ('csv', 'xls', 'xlsx')
+
     def __init__(self):
         self.processors = {
             'pdf': PDFProcessor(),
@@ -26,10 +69,10 @@ class FileLoader:
         self.STANDARD_COLUMNS = list(self.HEADER_SYNONYMS.keys())
 
 
-    def standardize_columns(self, df):
-        """Map columns to standard names"""
+    def column_map(self, columns):
+        """Map each column name to its standard name (or itself if unknown)"""
         col_map = {}
-        for col in df.columns:
+        for col in columns:
             lower_col = col.lower().strip()
             matched = False
             for standard, variants in self.HEADER_SYNONYMS.items():
@@ -39,7 +82,12 @@ class FileLoader:
                     break
             if not matched:
                 col_map[col] = col  # Preserve original if no match
+        return col_map
 
+    def standardize_columns(self, df, col_map=None):
+        """Map columns to standard names"""
+        if col_map is None:
+            col_map = self.column_map(df.columns)
         df = df.rename(columns=col_map)
     
             # Ensure all standard columns exist
@@ -50,21 +98,89 @@ class FileLoader:
         return df[self.STANDARD_COLUMNS]
 
 
-    def load(self, file_obj: str, password: str = None, filename: str = None):
-        
+    def _get_processor(self, filename):
         ext = filename.lower().split('.')[-1]
         if ext not in self.processors:
             raise ValueError(f"Unsupported file type: {ext}")
-        
+        return self.processors[ext]
+
+    def resolve_layout(self, df):
+        """Return (fingerprint, layout, cached) for a freshly loaded frame.
+
+        Processors that detect where the table starts (Excel) tag the frame
+        with their own fingerprint; otherwise the header row alone is used.
+        A cached layout carries the column map and date format, so neither
+        has to be worked out again.
+        """
+        fingerprint = df.attrs.get('layout_fingerprint') or layout_registry.fingerprint(df.columns)
+        layout = layout_registry.get(fingerprint)
+        if layout is not None and set(layout['column_map']) == set(map(str, df.columns)):
+            return fingerprint, layout, True
+        layout = {
+            'skiprows': df.attrs.get('skiprows', 0),
+            'column_map': self.column_map(df.columns),
+            'date_format': None,
+        }
+        return fingerprint, layout, False
+
+    def _normalize(self, df, layout):
+        df = self.standardize_columns(df, layout['column_map'])
+        df['Date'], date_format, unparsed = date_normalizer.normalize(df['Date'], layout['date_format'])
+        df.attrs['unparsed_dates'] = unparsed
+        return df, date_format
 
-        processor = self.processors[ext]
+    def load(self, file_obj: str, password: str = None, filename: str = None):
+        processor = self._get_processor(filename)
         df = processor.load(file_obj.getvalue(), password)
-        df = self.standardize_columns(df)
-        df['Date'] = df['Date'].apply(safe_parse_date)
+        fingerprint, layout, cached = self.resolve_layout(df)
+        df, date_format = self._normalize(df, layout)
+        if not cached:
+            layout_registry.save(fingerprint, {**layout, 'date_format': date_format})
         return df
 
-def safe_parse_date(x):
-    try:
-        return pd.to_datetime(x).strftime('%Y-%m-%d')
-    except:
-        return None
\ No newline at end of file
+    def iter_chunks(self, file_obj, password: str = None, filename: str = None, chunksize: int = None):
+        """Yield standardized, date-parsed DataFrames of at most ``chunksize`` rows.
+
+        Processors that can read incrementally (CSV) never hold more than one
+        raw chunk in memory; the others are loaded once and sliced.
+        """
+        chunksize = chunksize or Config.INGEST_CHUNK_ROWS
+        processor = self._get_processor(filename)
+        if hasattr(processor, 'iter_chunks'):
+            raw_chunks = processor.iter_chunks(file_obj, password, chunksize=chunksize)
+        else:
+            df = processor.load(file_obj.getvalue(), password)
+            raw_chunks = (df.iloc[i:i + chunksize] for i in range(0, len(df), chunksize))
+
+        layout = None
+        for chunk in raw_chunks:
+            if layout is None:
+                fingerprint, layout, cached = self.resolve_layout(chunk)
+                chunk, date_format = self._normalize(chunk, layout)
+                # The format inferred from the first chunk is reused for the rest
+                layout = {**layout, 'date_format': date_format}
+                if not cached:
+                    layout_registry.save(fingerprint, layout)
+            else:
+                chunk, _ = self._normalize(chunk, layout)
+            yield chunk
+
+    def parse_chunks(self, file_obj, password: str = None, filename: str = None, chunksize: int = None):
+        """Like ``iter_chunks``, but CSV / Excel files go to a worker process.
+
+        With ``ANALYZE_PARSE_WORKERS`` set, the whole file is parsed in the
+        shared process pool so several uploads are parsed on separate cores,
+        and the chunks come back together. Otherwise, for PDFs, or if the pool
+        breaks, parsing happens in the calling thread.
+        """
+        chunksize = chunksize or Config.INGEST_CHUNK_ROWS
+        ext = (filename or '').lower().split('.')[-1]
+        if Config.ANALYZE_PARSE_WORKERS < 1 or ext not in self.PROCESS_PARSED_TYPES:
+            return self.iter_chunks(file_obj, password, filename, chunksize)
+        pool = _get_parse_pool()
+        try:
+            return iter(pool.submit(_parse_chunks, file_obj.getvalue(), password, filename, chunksize).result())
+        except BrokenProcessPool as e:
+            logger.warning(f"Parse pool failed, parsing {filename} in-process: {e}")
+            _discard_parse_pool(pool)
+            return self.iter_chunks(file_obj, password, filename, chunksize)
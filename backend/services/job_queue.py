@@ -0,0 +1,332 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.sqlite_store import sqlite_connection
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job handler once its job has been cancelled"""
+
+
+class Job:
+    """Handle passed to a job handler for reporting progress and noticing cancellation"""
+
+    # Seconds between progress writes / cancellation checks against the job table
+    SYNC_INTERVAL = 1.0
+
+    def __init__(self, queue, job_id, session_id):
+        self.queue = queue
+        self.id = job_id
+        self.session_id = session_id
+        self._last_report = 0.0
+        self._last_check = 0.0
+
+    def report(self, progress, force=False):
+        """Record progress; writes are throttled unless ``force`` is set"""
+        now = time.monotonic()
+        if force or now - self._last_report >= self.SYNC_INTERVAL:
+            self._last_report = now
+            self.queue._update(self.id, progress=progress)
+
+    def check_cancelled(self):
+        """Raise JobCancelled if the job was cancelled (checked at most once per SYNC_INTERVAL)"""
+        now = time.monotonic()
+        if self.id in self.queue._cancelled or now - self._last_check >= self.SYNC_INTERVAL:
+            self._last_check = now
+            if self.id in self.queue._cancelled or self.queue._status(self.id) == "cancelled":
+                raise JobCancelled()
+
+
+class JobQueue:
+    """Background jobs run on an in-process thread pool and tracked in SQLite.
+
+    ``submit`` records a job and returns its id straight away; one of
+    ``JOB_WORKERS`` threads then runs the handler registered for its kind
+    inside the app context. Status, progress and results live in a local
+    SQLite table, so any worker process can answer a status poll or a
+    cancellation. Submitting with a ``dedupe_key`` that matches a queued,
+    running or recently succeeded job returns that job instead of starting
+    another. Succeeded jobs are only reused within ``ttl``, which defaults
+    to the session lifetime so a reused result never outlives the data it
+    points at. Payloads may hold file passwords and are kept in memory only,
+    so jobs interrupted by a restart are marked failed rather than rerun.
+    Finished jobs are purged after ``ttl`` seconds.
+
+    Each job records the process that owns it (host, boot id and pid), and
+    that process refreshes ``updated_at`` on its unfinished jobs every
+    ``HEARTBEAT_INTERVAL`` seconds. A job is only failed as interrupted when
+    its owner is known to be gone or its heartbeat is older than
+    ``STALE_AFTER``, so a restarting worker leaves its siblings' jobs alone.
+    """
+
+    HEARTBEAT_INTERVAL = 15.0
+    STALE_AFTER = 4 * HEARTBEAT_INTERVAL
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            dedupe_key TEXT,
+            owner TEXT,
+            status TEXT NOT NULL,
+            progress TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_dedupe
+            ON jobs (dedupe_key) WHERE status IN ('queued', 'running');
+        CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs (updated_at);
+        CREATE INDEX IF NOT EXISTS idx_jobs_active ON jobs (status, updated_at) WHERE status IN ('queued', 'running');
+    """
+
+    def __init__(self, path, workers, ttl):
+        self.path = path
+        self.workers = workers
+        self.ttl = ttl
+        self.app = None
+        self._handlers = {}
+        self._cancelled = set()
+        self._active = set()
+        self._executor = None
+        self._heartbeat = None
+        self._lock = threading.Lock()
+        self.host, self.boot_id = socket.gethostname(), self._read_boot_id()
+
+    @property
+    def owner(self):
+        # Read per call: a forked worker has a different pid from the process that imported this module
+        return f"{self.host}:{self.boot_id}:{os.getpid()}"
+
+    def init_app(self, app):
+        """Bind the app the workers run in and fail jobs a dead process left unfinished"""
+        self.app = app
+        try:
+            with sqlite_connection(self.path, self.SCHEMA) as connection:
+                interrupted = self._recover(connection, time.time(), check_owners=True)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Job table recovery failed: {e}")
+            return
+        if interrupted:
+            logger.info(f"Marked {interrupted} interrupted jobs as failed")
+
+    def register(self, kind, handler):
+        """``handler(job, payload)`` runs a job of ``kind`` and returns its JSON-serializable result"""
+        self._handlers[kind] = handler
+
+    def submit(self, kind, session_id, payload, dedupe_key=None, reuse_succeeded=True):
+        """Queue a job; returns ``(job_id, deduplicated)``.
+
+        With ``reuse_succeeded`` off, only queued or running jobs count as
+        duplicates, for work whose outcome can change between runs. It may
+        also be a callable that receives a succeeded job's result and says
+        whether that result can still be handed out.
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.app is None:
+            raise RuntimeError("JobQueue.init_app has not been called")
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with sqlite_connection(self.path, self.SCHEMA) as connection:
+            connection.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled') AND updated_at < ?",
+                (now - self.ttl,),
+            )
+            self._recover(connection, now)
+            if dedupe_key:
+                reusable = reuse_succeeded if callable(reuse_succeeded) else None
+                existing = self._find_duplicate(connection, dedupe_key, now if reuse_succeeded else None, reusable)
+                if existing:
+                    return existing, True
+            try:
+                connection.execute(
+                    "INSERT INTO jobs (id, kind, session_id, dedupe_key, owner, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, 'queued', ?, ?)",
+                    (job_id, kind, session_id, dedupe_key, self.owner, now, now),
+                )
+            except sqlite3.IntegrityError:
+                # Another process queued the same work between the lookup and the insert
+                return self._find_duplicate(connection, dedupe_key, now), True
+        self._active.add(job_id)
+        self._get_executor().submit(self._run, job_id, kind, session_id, payload)
+        return job_id, False
+
+    def get(self, job_id):
+        """The job's state as a dict, or None if it is unknown or purged"""
+        with sqlite_connection(self.path, self.SCHEMA) as connection:
+            self._recover(connection, time.time(), job_id=job_id)
+            row = connection.execute(
+                "SELECT id, kind, session_id, status, progress, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "kind", "session_id", "status", "progress", "result", "error", "created_at", "updated_at")
+        job = dict(zip(keys, row))
+        for key in ("progress", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it had already finished"""
+        with sqlite_connection(self.path, self.SCHEMA) as connection:
+            cancelled = connection.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            ).rowcount
+        if cancelled:
+            self._cancelled.add(job_id)
+        return bool(cancelled)
+
+    def _run(self, job_id, kind, session_id, payload):
+        with self.app.app_context():
+            if not self._update(job_id, status="running", only_if="queued"):
+                self._cancelled.discard(job_id)
+                self._active.discard(job_id)
+                return  # cancelled while queued
+            job = Job(self, job_id, session_id)
+            try:
+                result = self._handlers[kind](job, payload)
+            except JobCancelled:
+                logger.info(f"Job {job_id} ({kind}) cancelled")
+            except Exception as e:
+                logger.error(f"Job {job_id} ({kind}) failed: {e}")
+                self._update(job_id, status="failed", error=str(e), only_if="running")
+            else:
+                self._update(job_id, status="succeeded", result=result, only_if="running")
+            finally:
+                self._cancelled.discard(job_id)
+                self._active.discard(job_id)
+
+    def _recover(self, connection, now, job_id=None, check_owners=False):
+        """Fail unfinished jobs whose heartbeat is stale or, with ``check_owners``, whose owner has exited"""
+        query = "SELECT id, owner, updated_at FROM jobs WHERE status IN ('queued', 'running')"
+        params = []
+        if job_id is not None:
+            query += " AND id = ?"
+            params.append(job_id)
+        if not check_owners:
+            query += " AND updated_at < ?"
+            params.append(now - self.STALE_AFTER)
+        interrupted = [
+            row_id for row_id, owner, updated_at in connection.execute(query, params)
+            if updated_at < now - self.STALE_AFTER or not self._owner_alive(owner)
+        ]
+        if not interrupted:
+            return 0
+        return connection.execute(
+            f"UPDATE jobs SET status = 'failed', error = 'Interrupted: the server process running it stopped', "
+            f"updated_at = ? WHERE status IN ('queued', 'running') AND id IN ({','.join('?' * len(interrupted))})",
+            [now, *interrupted],
+        ).rowcount
+
+    def _owner_alive(self, owner):
+        """False if ``owner`` is a process on this host that has exited; unknown owners count as alive"""
+        host, boot_id, pid = (owner or "::").rsplit(":", 2)
+        if host != self.host:
+            return True  # another machine or container; only its heartbeat can tell
+        if boot_id != self.boot_id:
+            return False  # this host has rebooted since
+        if not pid.isdigit():
+            return False
+        if int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            pass  # exists but belongs to another user
+        return True
+
+    @staticmethod
+    def _read_boot_id():
+        try:
+            with open("/proc/sys/kernel/random/boot_id") as f:
+                return f.read().strip()
+        except OSError:
+            return ""
+
+    def _beat(self):
+        """Heartbeat thread: keep ``updated_at`` fresh on this process's unfinished jobs"""
+        while True:
+            time.sleep(self.HEARTBEAT_INTERVAL)
+            active = list(self._active)
+            if not active:
+                continue
+            try:
+                with sqlite_connection(self.path, self.SCHEMA) as connection:
+                    connection.execute(
+                        f"UPDATE jobs SET updated_at = ? WHERE status IN ('queued', 'running') "
+                        f"AND id IN ({','.join('?' * len(active))})",
+                        [time.time(), *active],
+                    )
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+
+    def _find_duplicate(self, connection, dedupe_key, now=None, reusable=None):
+        """Newest active job with this key, or succeeded one (that ``reusable`` accepts) when ``now`` is given"""
+        rows = connection.execute(
+            "SELECT id, status, result FROM jobs WHERE dedupe_key = ? "
+            "AND (status IN ('queued', 'running') OR (status = 'succeeded' AND updated_at > ?)) "
+            "ORDER BY created_at DESC",
+            (dedupe_key, now - self.ttl if now is not None else float("inf")),
+        )
+        for job_id, status, result in rows:
+            if status != "succeeded" or reusable is None or reusable(json.loads(result) if result else None):
+                return job_id
+        return None
+
+    def _update(self, job_id, status=None, progress=None, result=None, error=None, only_if=None):
+        """Write the given fields; with ``only_if``, only while the job is in that status"""
+        fields = {"updated_at": time.time()}
+        if status is not None:
+            fields["status"] = status
+        if progress is not None:
+            fields["progress"] = json.dumps(progress, default=str)
+        if result is not None:
+            fields["result"] = json.dumps(result, default=str)
+        if error is not None:
+            fields["error"] = error
+        query = f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?"
+        params = [*fields.values(), job_id]
+        if only_if:
+            query += " AND status = ?"
+            params.append(only_if)
+        try:
+            with sqlite_connection(self.path, self.SCHEMA) as connection:
+                return connection.execute(query, params).rowcount > 0
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Job {job_id} update failed: {e}")
+            return False
+
+    def _status(self, job_id):
+        with sqlite_connection(self.path, self.SCHEMA) as connection:
+            row = connection.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+                self._heartbeat.start()
+            return self._executor
+
+
+job_queue = JobQueue(Config.JOB_QUEUE_PATH, Config.JOB_WORKERS, Config.JOB_TTL_SECONDS)
@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import sqlite3
+from config import Config
+from utils.sqlite_store import sqlite_connection
+
+logger = logging.getLogger(__name__)
+
+
+class LayoutRegistry:
+    """Persistent cache of resolved statement layouts.
+
+    A layout is what header discovery works out for a statement: the rows
+    to skip before the table header, the column-to-standard-name mapping
+    and the date format. Layouts are keyed by a fingerprint of the header
+    row and the shape of the preamble above it, so next month's export
+    from the same bank skips detection entirely. Entries are kept in a
+    local SQLite file with an in-memory dict in front of it.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS statement_layouts (
+            fingerprint TEXT PRIMARY KEY,
+            layout TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_used_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._layouts = {}
+
+    @staticmethod
+    def fingerprint(header_cells, preamble_shape=()):
+        """Stable key for a header row plus the non-empty cell count of each preamble row"""
+        header = [str(cell).strip().lower() for cell in header_cells]
+        payload = json.dumps({"header": header, "preamble": [int(count) for count in preamble_shape]})
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def get(self, fingerprint):
+        """Return the cached layout dict for ``fingerprint`` or None"""
+        if fingerprint in self._layouts:
+            return self._layouts[fingerprint]
+        try:
+            with sqlite_connection(self.path, self.SCHEMA) as connection:
+                row = connection.execute(
+                    "SELECT layout FROM statement_layouts WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+                if row is None:
+                    return None
+                connection.execute(
+                    "UPDATE statement_layouts SET hits = hits + 1, last_used_at = CURRENT_TIMESTAMP "
+                    "WHERE fingerprint = ?",
+                    (fingerprint,),
+                )
+        except (sqlite3.Error, OSError) as e:
+            # The cache is an optimization; detection still works without it
+            logger.warning(f"Layout cache read failed: {e}")
+            return None
+        layout = json.loads(row[0])
+        self._layouts[fingerprint] = layout
+        return layout
+
+    def save(self, fingerprint, layout):
+        self._layouts[fingerprint] = layout
+        try:
+            with sqlite_connection(self.path, self.SCHEMA) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO statement_layouts (fingerprint, layout) VALUES (?, ?)",
+                    (fingerprint, json.dumps(layout)),
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Layout cache write failed: {e}")
+
+
+layout_registry = LayoutRegistry(Config.LAYOUT_CACHE_PATH)
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from config import Config
+from utils.sqlite_store import sqlite_connection
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """Content-addressed, size-bounded store of LLM replies.
+
+    Entries are keyed by a hash of the model, a caller-supplied version and
+    the whitespace-normalized prompt, so any change to the prompt template
+    (or a bumped version for changes the text does not show) misses and old
+    entries simply age out. Once the stored replies exceed ``max_bytes`` the
+    least recently used ones are evicted. Replies carry statement data, so
+    none is served or kept more than ``ttl`` seconds after it was stored:
+    expired entries are skipped on read and purged on write. Hit, miss and
+    eviction counts are kept for the life of the process.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS llm_responses (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_llm_responses_last_used ON llm_responses (last_used_at);
+        CREATE INDEX IF NOT EXISTS idx_llm_responses_created ON llm_responses (created_at);
+    """
+
+    def __init__(self, path, max_bytes, ttl):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(prompt, model, version=""):
+        normalized = " ".join(prompt.split())
+        payload = json.dumps([model, version, normalized])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Return {key: response} for the keys that are cached and have not expired"""
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        if unique_keys:
+            placeholders = ",".join("?" * len(unique_keys))
+            try:
+                with sqlite_connection(self.path, self.SCHEMA) as connection:
+                    now = time.time()
+                    found = dict(connection.execute(
+                        f"SELECT key, response FROM llm_responses WHERE key IN ({placeholders}) AND created_at > ?",
+                        [*unique_keys, now - self.ttl],
+                    ).fetchall())
+                    if found:
+                        connection.execute(
+                            f"UPDATE llm_responses SET hits = hits + 1, last_used_at = ? "
+                            f"WHERE key IN ({','.join('?' * len(found))})",
+                            [now, *found],
+                        )
+            except (sqlite3.Error, OSError) as e:
+                # A cold cache only costs LLM calls
+                logger.warning(f"LLM cache read failed: {e}")
+        with self._lock:
+            self.counters["hits"] += sum(key in found for key in keys)
+            self.counters["misses"] += sum(key not in found for key in keys)
+        return found
+
+    def put(self, key, model, response):
+        now = time.time()
+        try:
+            with sqlite_connection(self.path, self.SCHEMA) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, model, response, size, created_at, last_used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, len(response.encode("utf-8")), now, now),
+                )
+                evicted = connection.execute(
+                    "DELETE FROM llm_responses WHERE created_at <= ?", (now - self.ttl,)
+                ).rowcount
+                evicted += connection.execute(
+                    "DELETE FROM llm_responses WHERE key IN ("
+                    "  SELECT key FROM ("
+                    "    SELECT key, SUM(size) OVER (ORDER BY last_used_at DESC, rowid DESC) AS running"
+                    "    FROM llm_responses"
+                    "  ) WHERE running > ?"
+                    ")",
+                    (self.max_bytes,),
+                ).rowcount
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"LLM cache write failed: {e}")
+            return
+        if evicted:
+            with self._lock:
+                self.counters["evictions"] += evicted
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+llm_cache = LLMResponseCache(Config.LLM_CACHE_PATH, Config.LLM_CACHE_MAX_BYTES, Config.LLM_CACHE_TTL_SECONDS)
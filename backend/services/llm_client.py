@@ -0,0 +1,149 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import openai
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Errors worth another attempt; anything else (bad request, auth) fails straight away
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute token buckets.
+
+    ``acquire`` blocks until both buckets can cover the call. A limit of 0
+    disables that bucket. Buckets start full, so a burst of up to one
+    minute's allowance goes out immediately.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0, clock=time.monotonic, sleep=time.sleep):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.levels = [float(requests_per_minute), float(tokens_per_minute)]
+        self.clock = clock
+        self.sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=0):
+        # A call bigger than a whole minute's budget would never fit; let it drain the bucket instead
+        wanted = (1, min(tokens, self.limits[1]))
+        while True:
+            with self._lock:
+                now = self.clock()
+                elapsed, self._updated = now - self._updated, now
+                wait = 0.0
+                for i, limit in enumerate(self.limits):
+                    if not limit:
+                        continue
+                    self.levels[i] = min(limit, self.levels[i] + elapsed * limit / 60)
+                    if self.levels[i] < wanted[i]:
+                        wait = max(wait, (wanted[i] - self.levels[i]) * 60 / limit)
+                if wait == 0:
+                    for i, limit in enumerate(self.limits):
+                        if limit:
+                            self.levels[i] -= wanted[i]
+                    return
+            self.sleep(wait)
+
+
+class LLMClient:
+    """Chat completions with bounded concurrency, rate limiting and retries.
+
+    ``complete_many`` runs prompts on a thread pool of
+    ``LLM_MAX_CONCURRENCY`` workers and returns the replies in prompt order,
+    so a run of batches takes about as long as its slowest batch. Every
+    call waits on the shared rate limiter, and retryable errors are retried
+    up to ``LLM_MAX_RETRIES`` times with full-jitter exponential backoff
+    (or the server's Retry-After when it sends one). Set
+    ``OPENAI_BASE_URL`` to point the client at another endpoint, e.g. a
+    local fake server in tests.
+    """
+
+    # Rough prompt size for the tokens-per-minute budget
+    CHARS_PER_TOKEN = 4
+    BACKOFF_BASE = 1.0
+    BACKOFF_CAP = 30.0
+
+    def __init__(self, max_concurrency=None, max_retries=None, rate_limiter=None):
+        self.max_concurrency = max_concurrency or Config.LLM_MAX_CONCURRENCY
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.rate_limiter = rate_limiter or RateLimiter(Config.LLM_REQUESTS_PER_MINUTE, Config.LLM_TOKENS_PER_MINUTE)
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._client_lock:
+            if self._client is None:
+                self._client = openai.OpenAI(
+                    api_key=Config.OPENAI_API_KEY,
+                    base_url=Config.OPENAI_BASE_URL or None,
+                    timeout=Config.LLM_REQUEST_TIMEOUT,
+                    max_retries=0,  # retries are handled here, under the rate limiter
+                )
+            return self._client
+
+    def complete(self, prompt: str, model: str, temperature: float = 0, timeout: float = None) -> str:
+        """Reply text for a single-message chat prompt.
+
+        ``timeout`` (default ``LLM_REQUEST_TIMEOUT``) bounds the whole call,
+        retries and backoff included; a call that runs out raises
+        ``TimeoutError``.
+        """
+        deadline = time.monotonic() + (timeout or Config.LLM_REQUEST_TIMEOUT)
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire(len(prompt) // self.CHARS_PER_TOKEN)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("LLM call timed out waiting for the rate limiter")
+            try:
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    timeout=remaining,
+                )
+                return response.choices[0].message.content.strip()
+            except RETRYABLE_ERRORS as e:
+                delay = self._retry_after(e)
+                if delay is None:
+                    delay = random.uniform(0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt))
+                if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                    raise
+                logger.warning(f"LLM call failed ({type(e).__name__}), retry {attempt + 1} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def complete_many(self, prompts: List[str], model: str, temperature: float = 0, timeout: float = None) -> list:
+        """Replies for ``prompts`` in the same order; a failed prompt's slot holds its exception"""
+        def run(prompt):
+            try:
+                return self.complete(prompt, model, temperature, timeout)
+            except Exception as e:
+                return e
+
+        if len(prompts) <= 1:
+            return [run(prompt) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(prompts))) as executor:
+            return list(executor.map(run, prompts))
+
+    @staticmethod
+    def _retry_after(error):
+        response = getattr(error, "response", None)
+        value = response.headers.get("retry-after") if response is not None else None
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+
+llm_client = LLMClient()
@@ -0,0 +1,242 @@
+import json
+import re
+import numpy as np
+import pandas as pd
+from config import Config
+
+
+class NarrationParser:
+    """Column-at-a-time Product/Mode extraction for bank narrations.
+
+    Rules are tried in priority order and the first one that matches a
+    narration decides the mode and how the product is cut out of it. A
+    ``prefix`` rule matches narrations starting with one of its patterns,
+    a ``keyword`` rule matches one of its patterns as a whole word
+    anywhere and a ``contains`` rule matches it anywhere, even inside a
+    word.
+
+    The product is ``join.join(narration.split(sep)[start:stop])`` trimmed
+    at the first '@' (UPI handles). A rule with ``unsplit`` set to
+    ``"narration"`` keeps the whole narration when ``sep`` is absent.
+
+    Distinct narrations are joined into one string per block and handled
+    through offsets: separators, '@' and pattern occurrences are located
+    with vectorized comparisons over the block's code points and mapped to
+    narrations with ``searchsorted``, so the only Python work per narration
+    is slicing out its product.
+    """
+
+    MATCH_TYPES = ("prefix", "keyword", "contains")
+    UNKNOWN = "Unknown"
+    # Characters joined per block; bounds the code point buffer at 4 bytes each
+    BLOCK_CHARS = 1 << 22
+
+    def __init__(self, rules, fallback):
+        for rule in rules:
+            if rule.get("match") not in self.MATCH_TYPES:
+                raise ValueError(f"Unsupported match type in narration rule {rule.get('name')}: {rule.get('match')}")
+        # Rules are tried in order; the fallback has no patterns and takes whatever is left
+        self.rules = [self._compile_rule(rule) for rule in rules] + [self._compile_rule(fallback)]
+
+    @staticmethod
+    def _compile_rule(rule):
+        product = rule["product"]
+        sep = product["sep"]
+        compiled = {
+            "mode": rule["mode"],
+            "match": rule.get("match"),
+            "patterns": list(rule.get("patterns", [])),
+            "sep": sep,
+            "start": product.get("start", 0),
+            "stop": product.get("stop"),
+            "join": product.get("join", sep),
+            "unsplit": product.get("unsplit"),
+        }
+        if len(sep) != 1:
+            raise ValueError(f"Narration rule {rule.get('name')} needs a single-character separator")
+        if compiled["start"] < 0 or (compiled["stop"] is not None and compiled["stop"] < 0):
+            raise ValueError(f"Narration rule {rule.get('name')} needs non-negative field positions")
+        if compiled["match"] == "keyword":
+            words = "|".join(re.escape(pattern) for pattern in compiled["patterns"])
+            compiled["keyword"] = re.compile(f"\\b(?:{words})\\b")
+        return compiled
+
+    def parse(self, narrations: pd.Series):
+        """Return (product, mode) Series aligned with ``narrations``."""
+        # Statements repeat the same narration a lot, so parse each distinct value once
+        codes, uniques = pd.factorize(narrations, use_na_sentinel=True)
+        products = np.empty(len(uniques) + 1, dtype=object)
+        modes = np.empty(len(uniques) + 1, dtype=object)
+        products[:] = modes[:] = self.UNKNOWN
+
+        uniques = np.asarray(uniques, dtype=object)
+        if pd.api.types.infer_dtype(uniques, skipna=False) == "string":
+            is_text = np.ones(len(uniques), dtype=bool)
+            texts = uniques
+        else:
+            is_text = np.fromiter((isinstance(value, str) for value in uniques), dtype=bool, count=len(uniques))
+            texts = uniques[is_text]
+        if len(texts):
+            text_products, rule_ids = self._parse_texts(texts)
+            products[:-1][is_text] = text_products
+            modes[:-1][is_text] = np.array([rule["mode"] for rule in self.rules], dtype=object)[rule_ids]
+
+        # The trailing slot catches factorize's -1 sentinel for missing values
+        return (
+            pd.Series(products[codes], index=narrations.index, dtype=object),
+            pd.Series(modes[codes], index=narrations.index, dtype=object),
+        )
+
+    def _parse_texts(self, texts):
+        """Products and rule indexes for an object array of distinct narrations"""
+        products = np.empty(len(texts), dtype=object)
+        rule_ids = np.empty(len(texts), dtype=np.int64)
+        lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+        ends = np.cumsum(lengths)
+        first = 0
+        while first < len(texts):
+            last = max(first + 1, int(np.searchsorted(ends, ends[first] - lengths[first] + self.BLOCK_CHARS, "right")))
+            products[first:last], rule_ids[first:last] = self._parse_block(texts[first:last], lengths[first:last])
+            first = last
+        return products, rule_ids
+
+    def _parse_block(self, texts, lengths):
+        joined = "".join(texts)
+        ends = np.cumsum(lengths)
+        starts = ends - lengths
+        if joined.isascii():
+            encoding, code_points = "ascii", np.frombuffer(joined.encode("ascii"), dtype=np.uint8)
+        else:
+            encoding = "utf-32-le"
+            code_points = np.frombuffer(joined.encode(encoding, "surrogatepass"), dtype=np.uint32)
+
+        positions = {}
+
+        def find(code):
+            """Sorted offsets of one code point in the block, followed by the block size as a sentinel"""
+            if code not in positions:
+                positions[code] = np.append(np.flatnonzero(code_points == code), len(joined))
+            return positions[code]
+
+        def encode(text):
+            """``text`` as code points comparable with the block's, or None if it cannot occur in it"""
+            try:
+                return np.frombuffer(text.encode(encoding, "surrogatepass"), dtype=code_points.dtype)
+            except UnicodeEncodeError:
+                return None
+
+        rule_ids = np.full(len(texts), len(self.rules) - 1, dtype=np.int64)
+        unmatched = np.ones(len(texts), dtype=bool)
+        for rule_id, rule in enumerate(self.rules[:-1]):
+            matched = np.zeros(len(texts), dtype=bool)
+            for pattern in map(encode, rule["patterns"]):
+                if pattern is None:
+                    continue
+                if rule["match"] == "prefix":
+                    rows = np.flatnonzero(unmatched & (lengths >= len(pattern)))
+                    for offset, code in enumerate(pattern):
+                        rows = rows[code_points[starts[rows] + offset] == code]
+                else:
+                    # Occurrences of the first character, narrowed one character at a time
+                    candidates = find(pattern[0])[:-1]
+                    candidates = candidates[candidates + len(pattern) <= len(joined)]
+                    for offset in range(1, len(pattern)):
+                        candidates = candidates[code_points[candidates + offset] == pattern[offset]]
+                    rows = np.searchsorted(ends, candidates, "right")
+                    rows = rows[candidates + len(pattern) <= ends[rows]]
+                matched[rows] = True
+            matched &= unmatched
+            if rule["match"] == "keyword":
+                # The substring search only shows the word is there; the regex checks it stands alone
+                candidates = np.flatnonzero(matched)
+                matched[candidates] = [bool(rule["keyword"].search(text)) for text in texts[candidates]]
+            rule_ids[matched] = rule_id
+            unmatched &= ~matched
+
+        products = np.empty(len(texts), dtype=object)
+        nowhere = np.array([len(joined)])
+        at_signs = find(encode("@")[0])
+        for rule_id, rule in enumerate(self.rules):
+            rows = np.flatnonzero(rule_ids == rule_id)
+            if not rows.size:
+                continue
+            sep_code = encode(rule["sep"])
+            separators = find(sep_code[0]) if sep_code is not None else nowhere
+            begin, end = self._product_span(rule, separators, at_signs, starts[rows], ends[rows])
+            sep, join = rule["sep"], rule["join"]
+            spans = zip(begin.tolist(), end.tolist())
+            if join == sep:
+                products[rows] = [joined[b:e].strip() for b, e in spans]
+            else:
+                products[rows] = [joined[b:e].replace(sep, join).strip() for b, e in spans]
+        return products, rule_ids
+
+    @staticmethod
+    def _product_span(rule, separators, at_signs, starts, ends):
+        """Offsets of ``join.join(text.split(sep)[start:stop])`` up to its first '@', per row"""
+        first = np.searchsorted(separators, starts)
+        count = np.searchsorted(separators, ends) - first
+        last = len(separators) - 1
+
+        def after_separator(n):
+            """Offset just past each row's n-th separator, or the row end if it has fewer"""
+            return np.where(count >= n, separators[np.minimum(first + n - 1, last)] + 1, ends)
+
+        begin = after_separator(rule["start"]) if rule["start"] else starts
+        if rule["stop"] is None:
+            end = ends
+        elif rule["stop"] > rule["start"]:
+            # The field ends where the next separator starts
+            end = np.maximum(after_separator(rule["stop"]) - (count >= rule["stop"]), begin)
+        else:
+            end = begin
+        if rule["unsplit"] == "narration":
+            whole = count == 0
+            begin, end = np.where(whole, starts, begin), np.where(whole, ends, end)
+        at = at_signs[np.searchsorted(at_signs, begin)]
+        return begin, np.minimum(end, at)
+
+
+class NarrationRuleRegistry:
+    """Narration rule sets loaded from a JSON file.
+
+    The file holds a ``default`` rule list, a ``fallback`` rule used when
+    nothing matches and optional ``sources`` rule lists keyed by the file
+    classification (``Source``). A source's own rules take priority over
+    the defaults; parsers are compiled once per source and reused.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._rule_sets = None
+        self._parsers = {}
+
+    def _load(self):
+        if self._rule_sets is None:
+            with open(self.path, encoding="utf-8") as f:
+                rule_sets = json.load(f)
+            if "default" not in rule_sets or "fallback" not in rule_sets:
+                raise ValueError(f"Narration rules file {self.path} needs 'default' and 'fallback' entries")
+            self._rule_sets = rule_sets
+        return self._rule_sets
+
+    def parser_for(self, source=None) -> NarrationParser:
+        if source not in self._parsers:
+            rule_sets = self._load()
+            source_rules = rule_sets.get("sources", {}).get(source, [])
+            self._parsers[source] = NarrationParser(source_rules + rule_sets["default"], rule_sets["fallback"])
+        return self._parsers[source]
+
+    def parse(self, narrations: pd.Series, sources: pd.Series = None):
+        """Return (product, mode) Series, parsing each source with its own rule set."""
+        if sources is None:
+            return self.parser_for().parse(narrations)
+
+        products = pd.Series(NarrationParser.UNKNOWN, index=narrations.index, dtype=object)
+        modes = pd.Series(NarrationParser.UNKNOWN, index=narrations.index, dtype=object)
+        for source, rows in narrations.groupby(sources, dropna=False, sort=False):
+            products[rows.index], modes[rows.index] = self.parser_for(None if pd.isna(source) else source).parse(rows)
+        return products, modes
+
+
+narration_rules = NarrationRuleRegistry(Config.NARRATION_RULES_PATH)
@@ -0,0 +1,99 @@
+import re
+from typing import List
+import pandas as pd
+from services.date_parser import date_normalizer
+
+
+class StatementLineParser:
+    """Deterministic parser for the transaction blocks pulled out of a PDF.
+
+    Most statements print one transaction per line as
+    ``date [value date] narration amount [Cr|Dr] [balance]``. Blocks of that
+    shape are turned into Date/Narration/Debit Amount/Credit Amount rows
+    here; anything it cannot read unambiguously is handed back so the
+    caller can send just those blocks to the LLM.
+
+    The direction of an amount comes from its Cr/Dr marker. Without one, a
+    line that also carries a running balance is resolved by comparing the
+    balance with the previous line's, and a line with no balance is a
+    debit (the same rule the LLM prompt uses).
+
+    Rows are indexed by the position of their block, and blocks handed
+    back are identified by position too, so the caller can merge in the
+    LLM's rows in statement order.
+    """
+
+    COLUMNS = ["Date", "Narration", "Debit Amount", "Credit Amount"]
+    DATE = r"\d{1,2}[/-]\d{1,2}[/-]\d{2,4}|\d{1,2}[ -][A-Za-z]{3}[ -]\d{2,4}"
+    AMOUNT = r"\d[\d,]*\.\d{2}"
+    LINE = re.compile(
+        rf"^(?P<date>{DATE})\s+(?:(?:{DATE})\s+)?(?P<narration>.+?)\s+"
+        rf"(?P<amount>{AMOUNT})(?:\s*(?P<marker>cr|dr)\b)?"
+        rf"(?:\s+(?P<balance>{AMOUNT})(?:\s*(?:cr|dr)\b)?)?$",
+        re.IGNORECASE,
+    )
+    # A narration holding another date or amount is probably two transactions run together
+    AMBIGUOUS_NARRATION = re.compile(rf"{DATE}|{AMOUNT}", re.IGNORECASE)
+    BALANCE_TOLERANCE = 0.005
+
+    def parse(self, blocks: List[str]):
+        """Return (rows DataFrame, positions of the blocks that could not be parsed confidently)"""
+        rows, positions, leftover = [], [], []
+        previous_balance = None
+        for position, block in enumerate(blocks):
+            match = self.LINE.match(block.strip())
+            if not match:
+                leftover.append(position)
+                continue
+
+            narration = match.group("narration").strip()
+            amount = self._amount(match.group("amount"))
+            balance = self._amount(match.group("balance")) if match.group("balance") else None
+            is_credit = self._is_credit(match.group("marker"), amount, balance, previous_balance)
+            if balance is not None:
+                previous_balance = balance
+
+            if (
+                is_credit is None
+                or not re.search(r"[A-Za-z]", narration)
+                or self.AMBIGUOUS_NARRATION.search(narration)
+            ):
+                leftover.append(position)
+                continue
+
+            rows.append({
+                "Date": match.group("date"),
+                "Narration": narration,
+                "Debit Amount": None if is_credit else amount,
+                "Credit Amount": amount if is_credit else None,
+            })
+            positions.append(position)
+
+        df = pd.DataFrame(rows, index=positions, columns=self.COLUMNS)
+        if not df.empty:
+            df["Date"], _, _ = date_normalizer.normalize(df["Date"])
+            undated = df["Date"].isna()
+            leftover = sorted(leftover + list(df.index[undated]))
+            df = df[~undated]
+        return df, leftover
+
+    def _is_credit(self, marker, amount, balance, previous_balance):
+        """True/False for credit/debit, or None when the direction is unclear"""
+        if marker:
+            return marker.lower() == "cr"
+        if balance is None:
+            return False
+        if previous_balance is None:
+            return None
+        if abs(previous_balance + amount - balance) < self.BALANCE_TOLERANCE:
+            return True
+        if abs(previous_balance - amount - balance) < self.BALANCE_TOLERANCE:
+            return False
+        return None
+
+    @staticmethod
+    def _amount(text):
+        return float(text.replace(",", ""))
+
+
+statement_line_parser = StatementLineParser()
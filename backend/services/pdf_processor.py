@@ -1,75 +1,213 @@
+import multiprocessing
+import os
 import pdfplumber
 import re
+import tempfile
+import threading
 import openai
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from io import StringIO, BytesIO
-from typing import List, Union
+from itertools import repeat
+from typing import Iterator, List, Union
 import PyPDF2
 from config import Config
 from flask import current_app
+from services.llm_cache import llm_cache
+from services.llm_client import llm_client
+from services.pdf_line_parser import statement_line_parser
+
+
+def _open_pdf(file: Union[str, bytes, BytesIO], password: str = None):
+    if isinstance(file, str):
+        return pdfplumber.open(file, password=password)
+    elif isinstance(file, bytes):
+        return pdfplumber.open(BytesIO(file), password=password)
+    elif isinstance(file, BytesIO):
+        return pdfplumber.open(file, password=password)
+    raise ValueError(f"Unsupported file type for PDF: {type(file)}")
+
+
+def _extract_page_texts(file: Union[str, bytes], password: str, page_numbers: range) -> List[str]:
+    """Worker task: text of the given (0-based) pages, in order; pools pass ``file`` as a path"""
+    with _open_pdf(file, password) as pdf:
+        texts = []
+        for number in page_numbers:
+            page = pdf.pages[number]
+            texts.append(page.extract_text() or "")
+            # pdfplumber caches parsed layout objects per page; drop them as we go
+            page.flush_cache()
+        return texts
+
+
+_page_pool = None
+_page_pool_pages = 0
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool(pages: int) -> ProcessPoolExecutor:
+    """Shared page extraction pool with room for ``pages`` more pages.
+
+    Workers are spawned rather than forked (the parent holds DB and HTTP
+    clients). Once the pool has been handed ``PDF_WORKER_MAX_PAGES`` pages per
+    worker it is retired and a fresh one started, so memory held by pdfminer
+    does not build up across uploads. A retired pool finishes the work it
+    already has. (``max_tasks_per_child`` would do this per worker but can
+    deadlock the pool on Python 3.11.)
+    """
+    global _page_pool, _page_pool_pages
+    with _page_pool_lock:
+        if _page_pool is not None and _page_pool_pages >= Config.PDF_WORKER_MAX_PAGES * Config.PDF_EXTRACT_WORKERS:
+            _page_pool.shutdown(wait=False)
+            _page_pool = None
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=Config.PDF_EXTRACT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _page_pool_pages = 0
+        _page_pool_pages += pages
+        return _page_pool
+
+
+def _discard_page_pool(pool: ProcessPoolExecutor):
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
 
 class PDFProcessor:
     def __init__(self):
         openai.api_key = Config.OPENAI_API_KEY
 
     def load(self, file: Union[str, bytes, BytesIO], password: str = None):
+        """Parse blocks locally where possible; only the rest go to the LLM.
+
+        The frame's ``parse_stats`` attr records how many blocks each path
+        handled. Rows from both paths are returned in statement order.
+        """
         extracted_blocks = self.extract_transaction_blocks(file, password)
-        df = self.parse_transactions_batch(extracted_blocks)
+        df, leftover = statement_line_parser.parse(extracted_blocks)
+        frames = [df] if not df.empty else []
+        if leftover:
+            llm_df = self.parse_transactions_batch([extracted_blocks[n] for n in leftover])
+            if not llm_df.empty:
+                # The prompt asks for the same four columns; align the names so rows stack
+                if len(llm_df.columns) == len(statement_line_parser.COLUMNS):
+                    llm_df.columns = statement_line_parser.COLUMNS
+                # Index the LLM rows by block position, like the local ones
+                llm_df.index = [leftover[n] for n in llm_df.index]
+                frames.append(llm_df)
+        if frames:
+            df = pd.concat(frames).sort_index(kind="stable")
+        df = df.reset_index(drop=True)
+
+        local_blocks = len(extracted_blocks) - len(leftover)
+        df.attrs['parse_stats'] = {'local_blocks': local_blocks, 'llm_blocks': len(leftover)}
+        current_app.logger.info(f"Parsed {local_blocks} blocks locally, sent {len(leftover)} to the LLM")
         return df
 
+    # Bytes read from the start (linearization dict), the end (trailer) and at the startxref offset (xref stream dict)
+    TRAILER_SNIFF_SIZE = 4096
+
     def is_password_protected(self, file: Union[str, bytes, BytesIO]):
+        """Check the trailer for an /Encrypt entry without parsing the whole PDF.
+
+        Only the last few KB and the cross-reference section they point to are
+        read, so the check costs the same for any file size. Files whose
+        trailer cannot be located fall back to PyPDF2.
+        """
         try:
             if isinstance(file, str):  # local path
                 with open(file, 'rb') as f:
-                    pdf_reader = PyPDF2.PdfReader(f)
+                    encrypted = self._sniff_encryption(f)
             elif isinstance(file, bytes):
-                pdf_reader = PyPDF2.PdfReader(BytesIO(file))
+                encrypted = self._sniff_encryption(BytesIO(file))
             elif isinstance(file, BytesIO):
-                pdf_reader = PyPDF2.PdfReader(file)
+                encrypted = self._sniff_encryption(file)
             else:
                 return False
 
-            return pdf_reader.is_encrypted
+            if encrypted is not None:
+                return encrypted
+            if isinstance(file, str):
+                with open(file, 'rb') as f:
+                    return PyPDF2.PdfReader(f).is_encrypted
+            return PyPDF2.PdfReader(BytesIO(file) if isinstance(file, bytes) else file).is_encrypted
         except Exception:
             return False
 
+    def _sniff_encryption(self, f):
+        """True/False from the trailer dictionary, or None if it cannot be trusted"""
+        head = f.read(self.TRAILER_SNIFF_SIZE)
+        f.seek(0, 2)
+        size = f.tell()
+        f.seek(max(0, size - self.TRAILER_SNIFF_SIZE))
+        tail = f.read()
+        f.seek(0)
+
+        # Linearized files keep the full trailer at the front; the one at the end may be partial
+        if b'/Linearized' in head:
+            return None
+
+        # Classic trailer: "trailer << ... >> startxref"
+        trailer_at = tail.rfind(b'trailer')
+        if trailer_at != -1:
+            end = tail.find(b'startxref', trailer_at)
+            return self._trailer_encryption(tail[trailer_at:end] if end != -1 else None)
+
+        # PDF 1.5+ cross-reference stream: its dictionary is the trailer
+        match = re.search(rb'startxref\s+(\d+)', tail)
+        if not match or int(match.group(1)) >= size:
+            return None
+        f.seek(int(match.group(1)))
+        xref = f.read(self.TRAILER_SNIFF_SIZE)
+        f.seek(0)
+        stream_at = xref.find(b'stream')
+        if b'/XRef' not in xref or stream_at == -1:
+            return None
+        return self._trailer_encryption(xref[:stream_at])
+
+    @staticmethod
+    def _trailer_encryption(trailer):
+        """An /Encrypt entry is conclusive; its absence only counts in a complete trailer with /Root"""
+        if trailer is None:
+            return None
+        if b'/Encrypt' in trailer:
+            return True
+        if b'/Root' not in trailer or b'>>' not in trailer:
+            return None
+        return False
+
     def extract_transaction_blocks(self, file: Union[str, bytes, BytesIO], password: str = None) -> List[str]:
         """Extract potential transaction blocks from PDF"""
         blocks = []
         current_block = []
 
         try:
-            if isinstance(file, str):
-                pdf = pdfplumber.open(file, password=password)
-            elif isinstance(file, bytes):
-                pdf = pdfplumber.open(BytesIO(file), password=password)
-            elif isinstance(file, BytesIO):
-                pdf = pdfplumber.open(file, password=password)
-            else:
-                raise ValueError(f"Unsupported file type for PDF: {type(file)}")
+            for text in self.iter_page_texts(file, password):
+                if not text:
+                    continue
 
-            with pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if not text:
+                for line in text.split('\n'):
+                    stripped = line.strip()
+                    if self.is_junk_line(stripped):
+                        continue
+                    if not stripped or re.fullmatch(r'[A-Z ]{4,}', stripped):
                         continue
 
-                    for line in text.split('\n'):
-                        stripped = line.strip()
-                        if self.is_junk_line(stripped):
-                            continue
-                        if not stripped or re.fullmatch(r'[A-Z ]{4,}', stripped):
-                            continue
-
-                        current_block.append(stripped)
+                    current_block.append(stripped)
 
-                        if len(current_block) >= 3 or self.is_possibly_transaction_block(current_block):
-                            if self.is_possibly_transaction_block(current_block):
-                                blocks.append(' '.join(current_block))
-                            current_block = []
+                    if len(current_block) >= 3 or self.is_possibly_transaction_block(current_block):
+                        if self.is_possibly_transaction_block(current_block):
+                            blocks.append(' '.join(current_block))
+                        current_block = []
 
-                if current_block and self.is_possibly_transaction_block(current_block):
-                    blocks.append(' '.join(current_block))
+            if current_block and self.is_possibly_transaction_block(current_block):
+                blocks.append(' '.join(current_block))
 
             current_app.logger.info(f"Extracted {len(blocks)} potential transaction blocks")
             return blocks
@@ -78,19 +216,53 @@ class PDFProcessor:
             current_app.logger.info(f"Error extracting transaction blocks: {e}")
             raise
 
+    def iter_page_texts(self, file: Union[str, bytes, BytesIO], password: str = None) -> Iterator[str]:
+        """Yield the text of each page in page order.
+
+        With ``PDF_EXTRACT_WORKERS`` set, PDFs of at least
+        ``PDF_PARALLEL_MIN_PAGES`` pages are split into runs of
+        ``PDF_PAGES_PER_TASK`` pages that are extracted in worker processes;
+        results still come back in page order. In-memory PDFs are written to
+        a temporary file first, so each task sends workers only the path and
+        its page numbers rather than a pickled copy of the document. If the
+        pool breaks (e.g. a worker is killed) the remaining pages are
+        extracted here instead.
+        """
+        with _open_pdf(file, password) as pdf:
+            page_count = len(pdf.pages)
+            if Config.PDF_EXTRACT_WORKERS < 1 or page_count < Config.PDF_PARALLEL_MIN_PAGES:
+                for page in pdf.pages:
+                    yield page.extract_text()
+                return
+
+        if isinstance(file, str):
+            path, temp_path = file, None
+        else:
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp:
+                temp.write(file.getvalue() if isinstance(file, BytesIO) else file)
+            path = temp_path = temp.name
+        step = max(1, Config.PDF_PAGES_PER_TASK)
+        page_runs = [range(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        done = 0
+        try:
+            pool = _get_page_pool(page_count)
+            try:
+                for texts in pool.map(_extract_page_texts, repeat(path), repeat(password), page_runs):
+                    yield from texts
+                    done += 1
+            except BrokenProcessPool as e:
+                current_app.logger.warning(f"PDF extraction pool failed, extracting serially: {e}")
+                _discard_page_pool(pool)
+                for page_run in page_runs[done:]:
+                    yield from _extract_page_texts(path, password, page_run)
+        finally:
+            if temp_path is not None:
+                os.unlink(temp_path)
+
     def detect_statement_source(self, file: Union[str, bytes, BytesIO], password: str = None) -> str:
         """Detect if the PDF is a credit or debit statement"""
         try:
-            if isinstance(file, str):
-                pdf = pdfplumber.open(file, password=password)
-            elif isinstance(file, bytes):
-                pdf = pdfplumber.open(BytesIO(file), password=password)
-            elif isinstance(file, BytesIO):
-                pdf = pdfplumber.open(file, password=password)
-            else:
-                raise ValueError(f"Unsupported file type for PDF: {type(file)}")
-
-            with pdf:
+            with _open_pdf(file, password) as pdf:
                 all_text = ""
                 for page in pdf.pages:
                     text = page.extract_text()
@@ -126,12 +298,12 @@ class PDFProcessor:
         has_amount = bool(re.search(r'[\d,]+\.\d{2}', combined))
         return has_date and has_amount
 
-    def parse_transactions_batch(self, lines: List[str], batch_size: int = 50) -> pd.DataFrame: 
-        """Parse transaction lines using GPT-4""" 
-        all_dataframes = [] 
-        for i in range(0, len(lines), batch_size): 
-            batch = lines[i:i + batch_size] 
-            prompt = f""" You are an assistant extracting valid bank transactions from raw text. 
+    PARSE_MODEL = "gpt-4"
+    # Bump when reply handling changes in a way the prompt text does not show
+    PROMPT_VERSION = "1"
+
+    def _batch_prompt(self, batch: List[str]) -> str:
+        return f""" You are an assistant extracting valid bank transactions from raw text. 
             From the lines below, extract only real transactions—those with: Dates (dd/mm/yyyy or dd/mm/yy)
               Modes (e.g., UPI, POS, AUTOPAY) 
               Merchants (e.g., ZOMATO, GOOGLEPLAY, PAY*) 
@@ -145,29 +317,53 @@ class PDFProcessor:
               Do not add an extra comma at the end of any line. 
               Each line must have exactly 3 commas (4 fields total). 
               Respond only in CSV strictly with this header containing 4 columns: Date,Narration,Debit Amount,Credit Amount 
-              Transaction lines: """ + "\n".join(f"{j+1}. {line}" for j, line in enumerate(batch))             
-            try: 
-                response = openai.ChatCompletion.create( 
-                    model="gpt-4", 
-                    messages=[{"role": "user", "content": prompt}], 
-                    temperature=0 ) 
-                result_text = response['choices'][0]['message']['content'].strip() 
-                cleaned_text = [] 
-                for line in result_text.splitlines(): 
-                    if line.count(',') > 3 and line.endswith(','): 
-                        cleaned_text.append(line.rstrip(',')) 
-                    else: 
-                        cleaned_text.append(line) 
-                    result_text = "\n".join(cleaned_text) 
-                df = pd.read_csv(StringIO(result_text)) 
-                all_dataframes.append(df) 
-            except Exception as e: 
-                current_app.logger.info(f"Error parsing batch starting at line {i}: {e}") 
-            continue
-        
-        if all_dataframes: 
-            final_df = pd.concat(all_dataframes, ignore_index=True) 
-            return final_df 
-        else: 
-            return pd.DataFrame(columns=["Date", "Description", "Debit", "Credit"])
+              Transaction lines: """ + "\n".join(f"{j+1}. {line}" for j, line in enumerate(batch))
+
+    def parse_transactions_batch(self, lines: List[str], batch_size: int = 50) -> pd.DataFrame:
+        """Parse transaction lines using GPT-4.
 
+        Replies are looked up in ``llm_cache`` first; the remaining batches
+        are sent concurrently through ``llm_client`` (rate limited, with
+        retries). The per-batch frames are stacked in batch order, each row
+        indexed by the position in ``lines`` of the line it came from. When a
+        reply has more or fewer rows than its batch has lines, its rows are
+        spread evenly over the batch's positions.
+        """
+        starts = range(0, len(lines), batch_size)
+        prompts = [self._batch_prompt(lines[i:i + batch_size]) for i in starts]
+        keys = [llm_cache.key(prompt, self.PARSE_MODEL, self.PROMPT_VERSION) for prompt in prompts]
+        cached = llm_cache.get_many(keys)
+        misses = [n for n, key in enumerate(keys) if key not in cached]
+        replies = [cached.get(key) for key in keys]
+        fresh = llm_client.complete_many([prompts[n] for n in misses], model=self.PARSE_MODEL, temperature=0)
+        for n, reply in zip(misses, fresh):
+            replies[n] = reply
+        current_app.logger.info(f"LLM parse cache: {len(prompts) - len(misses)} hits, {len(misses)} misses")
+
+        all_dataframes = []
+        for n, (i, result_text) in enumerate(zip(starts, replies)):
+            try:
+                if isinstance(result_text, Exception):
+                    raise result_text
+                cleaned_text = []
+                for line in result_text.splitlines():
+                    if line.count(',') > 3 and line.endswith(','):
+                        cleaned_text.append(line.rstrip(','))
+                    else:
+                        cleaned_text.append(line)
+                result_text = "\n".join(cleaned_text)
+                df = pd.read_csv(StringIO(result_text))
+                batch_lines = min(batch_size, len(lines) - i)
+                df.index = [i + j * batch_lines // len(df) for j in range(len(df))]
+                all_dataframes.append(df)
+                if n in misses:
+                    # Only replies that parsed are worth replaying
+                    llm_cache.put(keys[n], self.PARSE_MODEL, result_text)
+            except Exception as e:
+                current_app.logger.info(f"Error parsing batch starting at line {i}: {e}")
+
+        if all_dataframes:
+            final_df = pd.concat(all_dataframes)
+            return final_df
+        else:
+            return pd.DataFrame(columns=["Date", "Description", "Debit", "Credit"])
@@ -0,0 +1,113 @@
+import re
+import numpy as np
+import pandas as pd
+from config import Config
+
+
+class ProductMatcher:
+    """Resolve transaction products to the closest product in a tag mapping.
+
+    Names are normalized first (upper case, punctuation dropped, company
+    boilerplate such as LTD / PVT / INDIA and glued-on UPI / LTD suffixes
+    removed), so "ZOMATO LTD" and "ZOMATOUPI" both become "ZOMATO" and match
+    exactly. Names that still differ are compared on character trigrams
+    through an inverted index built once from the mapping: each query only
+    touches the mapped products it shares a trigram with, and the best one
+    wins if its Dice similarity reaches ``threshold``.
+    """
+
+    NOISE_TOKENS = {"LTD", "LIMITED", "PVT", "PRIVATE", "INDIA", "IN", "CO", "COM", "INC", "LLP", "UPI", "WWW"}
+    NOISE_SUFFIXES = ("UPI", "LTD")
+    NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+    # Shorter names share too few trigrams for a fuzzy score to mean anything
+    MIN_FUZZY_LENGTH = 4
+
+    def __init__(self, products, threshold=None):
+        self.threshold = Config.PRODUCT_MATCH_THRESHOLD if threshold is None else threshold
+        self.products = []
+        self._exact = {}
+        for product in pd.Series(products, dtype=object).dropna():
+            key = self.normalize(product)
+            if key and key not in self._exact:
+                self._exact[key] = len(self.products)
+                self.products.append(product)
+
+        self._trigrams = {}
+        names = list(self._exact)
+        pairs = [(self._trigram_id(gram), index) for index, name in enumerate(names) for gram in self.trigrams(name)]
+        trigram_ids = np.array([t for t, _ in pairs], dtype=np.int64)
+        product_ids = np.array([p for _, p in pairs], dtype=np.int64)
+        order = np.argsort(trigram_ids, kind="stable")
+        # CSR postings: products containing trigram t are _postings[_indptr[t]:_indptr[t + 1]]
+        self._postings = product_ids[order]
+        self._indptr = np.zeros(len(self._trigrams) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(trigram_ids, minlength=len(self._trigrams)), out=self._indptr[1:])
+        self._sizes = np.array([len(self.trigrams(name)) for name in names], dtype=np.int64)
+
+    @classmethod
+    def normalize(cls, product):
+        tokens = []
+        for token in cls.NON_ALNUM.sub(" ", str(product).upper()).split():
+            for suffix in cls.NOISE_SUFFIXES:
+                if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                    token = token[:-len(suffix)]
+            if token not in cls.NOISE_TOKENS:
+                tokens.append(token)
+        return " ".join(tokens)
+
+    @staticmethod
+    def trigrams(name):
+        padded = f" {name} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def _trigram_id(self, gram):
+        return self._trigrams.setdefault(gram, len(self._trigrams))
+
+    def match(self, products: pd.Series) -> pd.Series:
+        """Mapped product name for each of ``products`` (None where nothing is close enough)"""
+        codes, uniques = pd.factorize(products, use_na_sentinel=True)
+        keys = [self.normalize(product) for product in uniques]
+        best = np.array([self._exact.get(key, -1) for key in keys], dtype=np.int64)
+
+        fuzzy = [i for i, key in enumerate(keys) if best[i] < 0 and len(key) >= self.MIN_FUZZY_LENGTH]
+        if fuzzy and self.products:
+            best[fuzzy] = self._best_fuzzy([keys[i] for i in fuzzy])
+
+        names = np.array(self.products + [None, None], dtype=object)
+        # -1 (no match) and factorize's -1 (missing) both land on a trailing None
+        return pd.Series(names[np.where(codes < 0, -1, best[codes])], index=products.index, dtype=object)
+
+    def _best_fuzzy(self, names):
+        """Index of the best mapped product per name, or -1"""
+        query_ids, trigram_ids, query_sizes = [], [], []
+        for query, name in enumerate(names):
+            grams = self.trigrams(name)
+            query_sizes.append(len(grams))
+            for gram in grams:
+                trigram = self._trigrams.get(gram)
+                if trigram is not None:
+                    query_ids.append(query)
+                    trigram_ids.append(trigram)
+        result = np.full(len(names), -1, dtype=np.int64)
+        if not trigram_ids:
+            return result
+
+        query_ids = np.array(query_ids, dtype=np.int64)
+        trigram_ids = np.array(trigram_ids, dtype=np.int64)
+        starts, ends = self._indptr[trigram_ids], self._indptr[trigram_ids + 1]
+        counts = ends - starts
+        # Expand every (query, trigram) into one row per mapped product on that trigram's posting list
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        pair_queries = np.repeat(query_ids, counts)
+        pair_products = self._postings[positions]
+
+        pair_keys, shared = np.unique(pair_queries * len(self.products) + pair_products, return_counts=True)
+        pair_queries, pair_products = np.divmod(pair_keys, len(self.products))
+        scores = 2 * shared / (np.asarray(query_sizes)[pair_queries] + self._sizes[pair_products])
+
+        # Highest score per query; ties go to the longer (more specific) mapped name
+        order = np.lexsort((-self._sizes[pair_products], -scores, pair_queries))
+        first = order[np.r_[True, pair_queries[order][1:] != pair_queries[order][:-1]]]
+        accepted = first[scores[first] >= self.threshold]
+        result[pair_queries[accepted]] = pair_products[accepted]
+        return result
@@ -0,0 +1,90 @@
+"""
+Reader engine selection for CSV and Excel uploads.
+
+pandas can parse CSV with pyarrow and Excel with calamine, both much faster
+than the default C / openpyxl readers, but they are optional installs. The
+``CSV_READER_ENGINE`` / ``EXCEL_READER_ENGINE`` settings pick an engine by
+name, or ``auto`` to use the fast one when it is importable and fall back
+to the pandas default otherwise.
+
+Run ``python -m services.reader_engines [rows]`` from ``backend/`` to
+compare the installed engines on the bundled sample scaled up to ``rows``.
+"""
+
+import importlib.util
+import io
+import os
+import sys
+import time
+import pandas as pd
+
+# Engine name -> module that has to be importable for it ("None" = always available)
+CSV_ENGINES = {"pyarrow": "pyarrow", "c": None, "python": None}
+EXCEL_ENGINES = {"calamine": "python_calamine", "openpyxl": "openpyxl"}
+
+FAST_CSV_ENGINE = "pyarrow"
+DEFAULT_CSV_ENGINE = "c"
+FAST_EXCEL_ENGINE = "calamine"
+DEFAULT_EXCEL_ENGINE = "openpyxl"
+
+
+def is_engine_available(engines, name):
+    module = engines[name]
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def _resolve(engines, preference, fast, default):
+    preference = (preference or "auto").lower()
+    if preference == "auto":
+        return fast if is_engine_available(engines, fast) else default
+    if preference not in engines:
+        raise ValueError(f"Unknown reader engine: {preference}")
+    return preference if is_engine_available(engines, preference) else default
+
+
+def resolve_csv_engine(preference=None):
+    """Engine name to pass as ``pd.read_csv(engine=...)``"""
+    return _resolve(CSV_ENGINES, preference, FAST_CSV_ENGINE, DEFAULT_CSV_ENGINE)
+
+
+def resolve_excel_engine(preference=None):
+    """Engine name to pass as ``pd.read_excel(engine=...)``"""
+    return _resolve(EXCEL_ENGINES, preference, FAST_EXCEL_ENGINE, DEFAULT_EXCEL_ENGINE)
+
+
+def _time_engines(engines, read, data):
+    timings = {}
+    for name in engines:
+        if not is_engine_available(engines, name):
+            continue
+        start = time.perf_counter()
+        df = read(io.BytesIO(data), name)
+        timings[name] = (time.perf_counter() - start, len(df))
+    return timings
+
+
+def benchmark(rows=100_000, sample_path=None):
+    """Time every installed engine on the sample statement scaled to ``rows`` rows"""
+    sample_path = sample_path or os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "sample_data", "sample.csv"
+    )
+    sample = pd.read_csv(sample_path)
+    df = pd.concat([sample] * (rows // len(sample) + 1), ignore_index=True).iloc[:rows]
+
+    csv_data = df.to_csv(index=False).encode()
+    excel_buffer = io.BytesIO()
+    df.to_excel(excel_buffer, index=False)
+
+    return {
+        "csv": _time_engines(CSV_ENGINES, lambda f, engine: pd.read_csv(f, engine=engine), csv_data),
+        "excel": _time_engines(
+            EXCEL_ENGINES, lambda f, engine: pd.read_excel(f, engine=engine), excel_buffer.getvalue()
+        ),
+    }
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    for file_type, timings in benchmark(rows).items():
+        for engine, (seconds, parsed_rows) in sorted(timings.items(), key=lambda item: item[1][0]):
+            print(f"{file_type:<6} {engine:<10} {seconds:8.3f}s  {parsed_rows} rows")
@@ -0,0 +1,151 @@
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import pandas as pd
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStaging:
+    """Parsed /analyze results kept on the server between requests.
+
+    Each analyzed file is staged under ``<root>/<session_id>/<staged_id>``,
+    where the staged id is a hash of the file's S3 key, as one part file per
+    parsed chunk: Parquet when pyarrow is installed, pandas pickle otherwise.
+    Parts are written to a temporary directory that only replaces the staged
+    one once the whole file has parsed, so /consolidate-files never sees a
+    half-written result. Session directories untouched for ``ttl`` seconds
+    (the session lifetime) are purged as new results come in.
+    """
+
+    FORMAT = "parquet" if importlib.util.find_spec("pyarrow") is not None else "pickle"
+    SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+    STAGED_ID = re.compile(r"^[0-9a-f]{32}$")
+    PURGE_INTERVAL = 60
+    # Every part is staged with the same typed schema, however a chunk spelled its values
+    TEXT_COLUMNS = ("Date", "Narration", "Chq/Ref No", "Value Date", "Source")
+    AMOUNT_COLUMNS = ("Debit Amount", "Credit Amount", "Closing Balance")
+
+    def __init__(self, root, ttl):
+        self.root = root
+        self.ttl = ttl
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def staged_id(s3_key):
+        return hashlib.sha256(s3_key.encode("utf-8")).hexdigest()[:32]
+
+    def writer(self, session_id, s3_key):
+        """A StagedResultWriter for one file; use it as a context manager"""
+        self.purge_expired()
+        return StagedResultWriter(self, session_id, self.staged_id(s3_key))
+
+    def load(self, session_id, staged_id):
+        """The staged DataFrame; raises ValueError if it is unknown or has expired"""
+        path = self._path(session_id, staged_id)
+        try:
+            parts = sorted(name for name in os.listdir(path) if name.startswith("part-"))
+        except FileNotFoundError:
+            raise ValueError("Staged results not found or expired; analyze the file again")
+        frames = [self._read_part(os.path.join(path, name)) for name in parts]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        # Text columns come back as pandas strings; hand them on as plain objects with None, like parsed JSON
+        for column in df.columns[df.dtypes == "string"]:
+            df[column] = df[column].astype(object).where(df[column].notna(), None)
+        return df
+
+    def exists(self, session_id, staged_id):
+        """Whether a staged result is still on disk; it goes once its session expires"""
+        try:
+            return os.path.isdir(self._path(session_id, staged_id))
+        except ValueError:
+            return False
+
+    def purge_expired(self, now=None):
+        """Remove session directories older than ``ttl``; runs at most once a minute"""
+        now = now or time.time()
+        with self._lock:
+            if now - self._last_purge < self.PURGE_INTERVAL:
+                return
+            self._last_purge = now
+        try:
+            sessions = os.listdir(self.root)
+        except FileNotFoundError:
+            return
+        for name in sessions:
+            path = os.path.join(self.root, name)
+            try:
+                if now - os.path.getmtime(path) > self.ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                continue
+
+    def _path(self, session_id, staged_id=None):
+        if not self.SESSION_ID.match(str(session_id)):
+            raise ValueError("Invalid session_id")
+        if staged_id is None:
+            return os.path.join(self.root, session_id)
+        if not self.STAGED_ID.match(str(staged_id)):
+            raise ValueError("Invalid staged_id")
+        return os.path.join(self.root, session_id, staged_id)
+
+    def _write_part(self, df, path):
+        # Amounts may be read as text ("1,000.00", "-"); invalid ones become NaN, as in consolidation
+        amounts = {
+            column: pd.to_numeric(df[column].astype(str).str.replace(",", ""), errors="coerce").astype("float64")
+            for column in self.AMOUNT_COLUMNS
+            if column in df.columns
+        }
+        df = df.assign(**amounts).astype({column: "string" for column in self.TEXT_COLUMNS if column in df.columns})
+        if self.FORMAT == "parquet":
+            df.to_parquet(path + ".parquet", index=False)
+        else:
+            df.to_pickle(path + ".pkl")
+
+    @staticmethod
+    def _read_part(path):
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_pickle(path)
+
+
+class StagedResultWriter:
+    """Writes one file's parsed chunks; the result becomes visible when the block exits cleanly"""
+
+    def __init__(self, staging, session_id, staged_id):
+        self.staging = staging
+        self.staged_id = staged_id
+        self.path = staging._path(session_id, staged_id)
+        self._temp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self._parts = 0
+
+    def __enter__(self):
+        os.makedirs(self._temp_path)
+        return self
+
+    def write(self, df):
+        self.staging._write_part(df, os.path.join(self._temp_path, f"part-{self._parts:05d}"))
+        self._parts += 1
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            shutil.rmtree(self._temp_path, ignore_errors=True)
+            return False
+        # Re-analyzing a file replaces what was staged for it
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._temp_path, self.path)
+        os.utime(os.path.dirname(self.path))
+        return False
+
+
+result_staging = ResultStaging(Config.RESULT_STAGING_PATH, Config.RESULT_STAGING_TTL_SECONDS)
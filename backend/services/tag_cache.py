@@ -0,0 +1,134 @@
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from utils.sqlite_store import sqlite_connection
+
+logger = logging.getLogger(__name__)
+
+
+class TagSuggestionCache:
+    """Product -> tag suggestions, reused within a session or across all of them.
+
+    Keys are the normalized product name plus an amount bucket, since the
+    tagging rules depend on the amount (80-350 is Travel). With ``scope``
+    ``"session"`` they are prefixed with the session id, so one user's
+    merchants and tags never answer another's. ``"shared"`` drops the prefix
+    and lets every session reuse every answer; product names can identify
+    people (UPI payees), so only use it where all sessions belong to one
+    tenant. Lookups go to an
+    in-process LRU first and then to a local SQLite table; entries older
+    than ``ttl`` seconds are ignored in both, so merchants get re-asked now
+    and then. Counters record how many products, and how many whole LLM
+    requests, the cache saved.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tag_suggestions (
+            key TEXT PRIMARY KEY,
+            tag TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+    # Upper bounds of the amount buckets; the first two follow the prompt's Travel rule
+    AMOUNT_BUCKETS = (80, 350, 1000, 5000, 20000)
+    SCOPES = ("session", "shared")
+
+    def __init__(self, path, ttl, lru_size, scope="session"):
+        if scope not in self.SCOPES:
+            raise ValueError(f"Unsupported tag cache scope: {scope}")
+        self.path = path
+        self.scope = scope
+        self.ttl = ttl
+        self.lru_size = lru_size
+        self.counters = {"lru_hits": 0, "durable_hits": 0, "misses": 0, "llm_requests_avoided": 0}
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, product, amount, session_id=None):
+        name = re.sub(r"[^A-Z0-9]+", " ", str(product).upper()).strip()
+        try:
+            bucket = bisect.bisect_right(self.AMOUNT_BUCKETS, float(amount))
+        except (TypeError, ValueError):
+            bucket = "na"
+        if self.scope == "shared":
+            return f"{name}|{bucket}"
+        if not session_id:
+            raise ValueError("session_id is required")
+        return f"{session_id}|{name}|{bucket}"
+
+    def get_many(self, keys):
+        """Return {key: tag} for the keys with a fresh entry"""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._lru.get(key)
+                if entry and now - entry[1] < self.ttl:
+                    self._lru.move_to_end(key)
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+            self.counters["lru_hits"] += len(found)
+
+        if missing:
+            placeholders = ",".join("?" * len(missing))
+            try:
+                with sqlite_connection(self.path, self.SCHEMA) as connection:
+                    rows = connection.execute(
+                        f"SELECT key, tag, updated_at FROM tag_suggestions "
+                        f"WHERE key IN ({placeholders}) AND updated_at > ?",
+                        [*missing, now - self.ttl],
+                    ).fetchall()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"Tag cache read failed: {e}")
+                rows = []
+            with self._lock:
+                for key, tag, updated_at in rows:
+                    found[key] = tag
+                    self._remember(key, tag, updated_at)
+                self.counters["durable_hits"] += len(rows)
+                self.counters["misses"] += len(missing) - len(rows)
+        return found
+
+    def put_many(self, tags):
+        """Store {key: tag}"""
+        if not tags:
+            return
+        now = time.time()
+        with self._lock:
+            for key, tag in tags.items():
+                self._remember(key, tag, now)
+        try:
+            with sqlite_connection(self.path, self.SCHEMA) as connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO tag_suggestions (key, tag, updated_at) VALUES (?, ?, ?)",
+                    [(key, tag, now) for key, tag in tags.items()],
+                )
+                # Session-scoped entries are never read again once stale; don't let them pile up
+                connection.execute("DELETE FROM tag_suggestions WHERE updated_at <= ?", (now - self.ttl,))
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Tag cache write failed: {e}")
+
+    def record_avoided_request(self):
+        with self._lock:
+            self.counters["llm_requests_avoided"] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+    def _remember(self, key, tag, updated_at):
+        self._lru[key] = (tag, updated_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+
+tag_cache = TagSuggestionCache(
+    Config.TAG_CACHE_PATH, Config.TAG_CACHE_TTL_SECONDS, Config.TAG_CACHE_LRU_SIZE, Config.TAG_CACHE_SCOPE
+)
@@ -0,0 +1,223 @@
+import bisect
+import logging
+import re
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from config import Config
+from services.tag_cache import TagSuggestionCache
+from utils.sqlite_store import sqlite_connection
+
+logger = logging.getLogger(__name__)
+
+
+class TagClassifier:
+    """Offline product -> tag model: character n-grams into softmax regression.
+
+    Each product is described by the 2-4 character n-grams of its
+    normalized name plus, when known, an amount-bucket token, so
+    "ZOMATO LTD" lands next to "ZOMATO" and corrections can teach
+    amount-dependent tags. The model is trained from the bundled product
+    mappings plus the corrections users make through /update-tag, which are
+    kept in a local SQLite file and outweigh the bundled rows. Training
+    takes well under a second; it runs once at startup and again on a
+    background thread ``REFIT_DELAY`` seconds after a correction, so a burst
+    of corrections costs one refit. Each fit publishes its vocabulary, tags
+    and weights as one tuple, and ``predict`` keeps using the previous
+    model until the new one is swapped in.
+
+    ``predict`` returns a (tag, confidence) pair per product; callers send
+    anything under ``TAG_CLASSIFIER_MIN_CONFIDENCE`` to the LLM.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tag_corrections (
+            product TEXT PRIMARY KEY,
+            tag TEXT NOT NULL,
+            avg_spend REAL,
+            created_at REAL NOT NULL
+        );
+    """
+    NGRAM_SIZES = (2, 3, 4)
+    NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+    CORRECTION_WEIGHT = 3.0
+    EPOCHS = 300
+    LEARNING_RATE = 2.0
+    L2 = 1e-4
+    REFIT_DELAY = 2.0
+
+    def __init__(self, mappings_path, corrections_path):
+        self.mappings_path = mappings_path
+        self.corrections_path = corrections_path
+        self.model = None  # (vocabulary, tags, weights), replaced as a whole by each fit
+        self._corrections = None
+        self._stale = True
+        self._refit_timer = None
+        self._fit_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+    def features(self, product, amount=None):
+        name = self.NON_ALNUM.sub(" ", str(product).upper()).strip()
+        padded = f" {name} "
+        grams = {padded[i:i + n] for n in self.NGRAM_SIZES for i in range(len(padded) - n + 1)}
+        try:
+            grams.add(f"#amount{bisect.bisect_right(TagSuggestionCache.AMOUNT_BUCKETS, float(amount))}")
+        except (TypeError, ValueError):
+            pass
+        return grams
+
+    def load(self):
+        """Train on the bundled mappings and stored corrections (idempotent until a new correction)"""
+        with self._fit_lock:
+            with self._state_lock:
+                if not self._stale:
+                    return
+                # A correction arriving from here on marks the model stale again
+                self._stale = False
+                corrections = self._corrections
+            start = time.perf_counter()
+            try:
+                if corrections is None:
+                    corrections = self._read_corrections()
+                examples = self._training_examples(corrections)
+                model = self._fit(examples)
+            except Exception:
+                with self._state_lock:
+                    self._stale = True
+                raise
+            with self._state_lock:
+                if not self._stale:
+                    self._corrections = corrections
+            self.model = model
+            logger.info(
+                f"Tag classifier trained on {len(examples)} examples, {len(model[1])} tags "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+
+    def record_correction(self, product, tag, avg_spend=None):
+        """Keep a user's tag for ``product`` as training data; the model refits in the background"""
+        if not product or not tag:
+            return
+        try:
+            with sqlite_connection(self.corrections_path, self.SCHEMA) as connection:
+                connection.execute(
+                    "INSERT OR REPLACE INTO tag_corrections (product, tag, avg_spend, created_at) VALUES (?, ?, ?, ?)",
+                    (product, tag, avg_spend, time.time()),
+                )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Tag correction write failed: {e}")
+            return
+        with self._state_lock:
+            self._corrections = None
+            self._stale = True
+            if self._refit_timer is None:
+                self._refit_timer = threading.Timer(self.REFIT_DELAY, self._refit)
+                self._refit_timer.daemon = True
+                self._refit_timer.start()
+
+    def predict(self, products_with_amounts):
+        """Return [(tag, confidence)] for a list of (product, amount) pairs"""
+        model = self.model
+        if model is None:
+            self.load()
+            model = self.model
+        vocabulary, tags, weights = model
+        if not products_with_amounts:
+            return []
+        if not tags:
+            return [(None, 0.0)] * len(products_with_amounts)
+        ids, values, offsets = self._encode(
+            [self.features(product, amount) for product, amount in products_with_amounts], vocabulary
+        )
+        probabilities = self._probabilities(weights, ids, values, offsets)
+        best = probabilities.argmax(axis=1)
+        confidences = probabilities[np.arange(len(best)), best]
+        return [(tags[i], float(c)) for i, c in zip(best, confidences)]
+
+    def _refit(self):
+        with self._state_lock:
+            self._refit_timer = None
+        try:
+            self.load()
+        except Exception as e:
+            logger.warning(f"Tag classifier refit failed: {e}")
+
+    def _read_corrections(self):
+        try:
+            with sqlite_connection(self.corrections_path, self.SCHEMA) as connection:
+                return connection.execute("SELECT product, avg_spend, tag FROM tag_corrections").fetchall()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Tag correction read failed: {e}")
+            return []
+
+    def _training_examples(self, corrections):
+        examples = []
+        try:
+            mappings = pd.read_csv(self.mappings_path, dtype=str, skipinitialspace=True).dropna()
+            examples += [
+                (product, None, tag.strip(), 1.0) for product, tag in zip(mappings["Product"], mappings["Tag"])
+            ]
+        except (OSError, KeyError, pd.errors.ParserError) as e:
+            logger.warning(f"Tag classifier could not read {self.mappings_path}: {e}")
+        examples += [(product, amount, tag, self.CORRECTION_WEIGHT) for product, amount, tag in corrections]
+        return examples
+
+    @staticmethod
+    def _encode(feature_sets, vocabulary, grow=False):
+        """Flattened (feature ids, values, row offsets); id 0 is a bias feature every row has"""
+        ids, lengths = [], []
+        for grams in feature_sets:
+            row = [0]
+            for gram in grams:
+                index = vocabulary.get(gram)
+                if index is None and grow:
+                    index = vocabulary[gram] = len(vocabulary) + 1
+                if index is not None:
+                    row.append(index)
+            ids.extend(row)
+            lengths.append(len(row))
+        lengths = np.asarray(lengths)
+        offsets = np.zeros(len(lengths), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        # L2-normalize each row so long names do not dominate
+        values = np.repeat(1 / np.sqrt(lengths), lengths)
+        return np.asarray(ids, dtype=np.int64), values, offsets
+
+    @staticmethod
+    def _probabilities(weights, ids, values, offsets):
+        scores = np.add.reduceat(weights[ids] * values[:, None], offsets)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        return scores / scores.sum(axis=1, keepdims=True)
+
+    def _fit(self, examples):
+        """Train on ``examples``; returns the (vocabulary, tags, weights) model"""
+        vocabulary = {}
+        tags = sorted({tag for _, _, tag, _ in examples})
+        if not examples:
+            return vocabulary, tags, None
+        tag_index = {tag: i for i, tag in enumerate(tags)}
+        ids, values, offsets = self._encode(
+            [self.features(product, amount) for product, amount, _, _ in examples], vocabulary, grow=True
+        )
+        labels = np.array([tag_index[tag] for _, _, tag, _ in examples])
+        sample_weights = np.array([weight for _, _, _, weight in examples])
+        sample_weights /= sample_weights.sum()
+        rows = np.repeat(np.arange(len(examples)), np.diff(np.append(offsets, len(ids))))
+        targets = np.zeros((len(examples), len(tags)))
+        targets[np.arange(len(examples)), labels] = 1
+
+        weights = np.zeros((len(vocabulary) + 1, len(tags)))
+        for _ in range(self.EPOCHS):
+            errors = (self._probabilities(weights, ids, values, offsets) - targets) * sample_weights[:, None]
+            contributions = errors[rows] * values[:, None]
+            gradient = np.column_stack([
+                np.bincount(ids, weights=contributions[:, c], minlength=len(weights)) for c in range(len(tags))
+            ])
+            weights -= self.LEARNING_RATE * (gradient + self.L2 * weights)
+        return vocabulary, tags, weights
+
+
+tag_classifier = TagClassifier(Config.TAG_TRAINING_MAPPINGS_PATH, Config.TAG_CORRECTIONS_PATH)
@@ -1,53 +1,16 @@
 import pandas as pd
 from datetime import datetime
 from .ai_service import ai_service
+from .narration_parser import narration_rules
+from .product_matcher import ProductMatcher
+from .result_staging import result_staging
 from flask import current_app
-import re
 
 class VisualizationService:
 
     def getProductAndMode(self, df):
-        product_values = []
-        mode_values = []
-
-
-        for narration in df['Narration']:
-            if not isinstance(narration, str):
-                product_values.append("Unknown")
-                mode_values.append("Unknown")
-                continue
-    
-            if 'UPI' in narration:
-                pdt = narration.split('-')[1].strip() if '-' in narration else narration.strip()
-                mode = "UPI"
-            elif 'POS' in narration:
-                pdt = " ".join(narration.split(' ')[2:]).strip()
-                mode = "POS"
-            elif 'ME DC' in narration:
-                pdt = " ".join(narration.split(' ')[4:]).strip()
-                mode = "Debit Card"
-            elif 'ATW' in narration:
-                pdt = " ".join(narration.split('-')[1:]).strip()
-                mode = "ATM"
-            elif 'SI' in narration:
-                pdt = "".join(narration.split(' ')[2:]).strip()
-                mode = "Automated Payment"
-            elif 'CC' in narration:
-                pdt = "".join(narration.split(' ')[2:]).strip()
-                mode = "Credit Card"
-            elif 'INSTALLMENT' in narration:
-                pdt = narration.split('-')[1]
-                mode = "AUTOPAY"
-            else:
-                pdt = narration.split('-')[0].strip()
-                mode = "Other"
-
-            pdt = re.split(r'@', pdt)[0].strip()
-            product_values.append(pdt)
-            mode_values.append(mode)
-
-        df['Product'] = product_values
-        df['Mode'] = mode_values
+        sources = df['Source'] if 'Source' in df.columns else None
+        df['Product'], df['Mode'] = narration_rules.parse(df['Narration'], sources)
         return df
 
     def clean_amount_columns(self, df):
@@ -67,13 +30,19 @@ class VisualizationService:
             all_transactions = []
             files_processed = 0
             total_transactions = 0
+            # Built once per session mapping and reused for every file
+            mapped_products = ProductMatcher(product_tag_mapping['Product'])
+            mapping = product_tag_mapping.rename(columns={'Product': 'MappedProduct'})
         
             for file_data in files_data:
-                transactions = file_data.get('transactions', [])
-                if not transactions:
+                # Files analyzed on this server arrive as a handle to their staged results
+                if file_data.get('staged_id'):
+                    df = result_staging.load(session_id, file_data['staged_id'])
+                else:
+                    df = pd.DataFrame(file_data.get('transactions', []))
+                if df.empty:
                     continue
 
-                df = pd.DataFrame(transactions)
                 df = df[['Date', 'Narration', 'Debit Amount', 'Credit Amount']]
                 df['Filename'] = file_data.get('filename', 'Unknown')
                 df['Source'] = file_data.get('source', 'Unknown')
@@ -82,9 +51,9 @@ class VisualizationService:
                 # Derive product and mode
                 df = self.getProductAndMode(df)
                 df = self.clean_amount_columns(df)
-                # Join with product_tag_mapping
-                
-                df = df.merge(product_tag_mapping, on='Product', how='left')
+                # Join with product_tag_mapping, tolerating name variants ("ZOMATO LTD" -> "ZOMATO")
+                df['MappedProduct'] = mapped_products.match(df['Product'])
+                df = df.merge(mapping, on='MappedProduct', how='left').drop(columns='MappedProduct')
 
                 all_transactions.append(df)
                 total_transactions += len(df)
@@ -101,9 +70,9 @@ class VisualizationService:
         except Exception as e:
             raise RuntimeError(f"Error consolidating transaction files: {e}")
 
-    def categorize_transactions(self,empty_products=None):
+    def categorize_transactions(self,empty_products=None, session_id=None):
         try:
-            return ai_service.get_tag_suggestions(empty_products)
+            return ai_service.get_tag_suggestions(empty_products, session_id)
         except Exception as e:
             current_app.logger.error(f"Exception - {e}")
 
@@ -0,0 +1,28 @@
+import os
+import sys
+import pytest
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The routes blueprint on a throwaway SQLite database, with jobs and staged results under tmp_path"""
+    import routes
+    from db.models import db
+    from services.job_queue import job_queue
+    from services.result_staging import result_staging
+
+    monkeypatch.setattr(job_queue, "path", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(result_staging, "root", str(tmp_path / "staged"))
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'app.db'}"
+    db.init_app(app)
+    app.register_blueprint(routes.main)
+    job_queue.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
@@ -0,0 +1,74 @@
+from datetime import date, datetime
+import pytest
+from sqlalchemy import DateTime, insert
+from db.db_handler import DatabaseService
+from db.models import Transactions, db
+
+ROWS = [
+    # Several rows per day so the id tie-breaker and time of day both matter
+    (datetime(2025, 1, day, hour, 30), f"NARRATION {n}", amount)
+    for n, (day, hour, amount) in enumerate([
+        (3, 9, 10), (1, 18, 20), (2, 0, 30), (1, 7, 40), (3, 9, 50), (2, 12, 60), (1, 7, 70),
+    ])
+]
+
+
+@pytest.fixture
+def service(app):
+    with app.app_context():
+        db.session.execute(insert(Transactions.__table__), [
+            {"session_id": "s1", "transaction_date": when, "narration": narration, "debit_amount": amount,
+             "credit_amount": 0, "product": narration, "mode": "UPI"}
+            for when, narration, amount in ROWS
+        ])
+        db.session.commit()
+        yield DatabaseService()
+
+
+@pytest.fixture
+def datetime_column(monkeypatch):
+    """schema/001 declares transaction_date DATETIME, which PyMySQL hands back as datetime"""
+    monkeypatch.setattr(Transactions.__table__.c.transaction_date, "type", DateTime())
+
+
+def all_pages(service, **kwargs):
+    ids, cursor, pages = [], None, 0
+    while pages < len(ROWS):
+        rows, cursor = service.get_transactions_page("s1", limit=2, cursor=cursor, **kwargs)
+        ids += [row["id"] for row in rows]
+        pages += 1
+        if cursor is None:
+            return ids, pages
+    pytest.fail("Paging did not reach the last page")
+
+
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+def test_date_pages_with_datetime_values(datetime_column, service, direction):
+    # datetime_column comes first so the rows are stored as DATETIME values too
+    rows, _ = service.get_transactions_page("s1", limit=len(ROWS), direction=direction)
+    expected = [row["id"] for row in rows]
+    ids, pages = all_pages(service, direction=direction)
+    assert pages == 4
+    assert ids == expected
+    dates = [row["date"] for row in rows]
+    assert dates == sorted(dates, reverse=direction == "desc")
+
+
+@pytest.mark.parametrize("direction", ["asc", "desc"])
+@pytest.mark.parametrize("sort", ["date", "debit_amount", "product", "id"])
+def test_pages_match_a_full_sort(service, sort, direction):
+    rows, _ = service.get_transactions_page("s1", sort=sort, direction=direction, limit=len(ROWS))
+    assert all_pages(service, sort=sort, direction=direction)[0] == [row["id"] for row in rows]
+
+
+def test_cursor_round_trips_dates_and_datetimes():
+    column = Transactions.__table__.c.transaction_date
+    for value in (date(2025, 1, 2), datetime(2025, 1, 2, 12, 30)):
+        cursor = DatabaseService._encode_cursor(value, 7)
+        condition = DatabaseService._after_cursor(cursor, column, "asc")
+        assert value in condition.compile().params.values()
+
+
+def test_invalid_cursor_is_rejected(service):
+    with pytest.raises(ValueError):
+        service.get_transactions_page("s1", cursor="not-a-cursor")
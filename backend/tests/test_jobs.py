@@ -0,0 +1,64 @@
+import time
+import pandas as pd
+import pytest
+import routes
+
+PASSWORD = "right"
+
+
+class FakeS3:
+    def download_fileobj(self, bucket, key, file_obj):
+        file_obj.write(b"statement")
+
+
+class PasswordProtectedLoader:
+    """Stands in for FileLoader: parses only with the right password, as an encrypted PDF would"""
+
+    def parse_chunks(self, file_obj, password=None, filename=None):
+        if password != PASSWORD:
+            raise ValueError("File has not been decrypted: password required")
+        yield pd.DataFrame({"Date": ["2025-01-01"], "Narration": ["UPI-RENT"], "Debit Amount": [100.0]})
+
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setattr(routes, "s3_client", FakeS3())
+    monkeypatch.setattr(routes, "FileLoader", PasswordProtectedLoader)
+    return app.test_client()
+
+
+def submit(client, password=None):
+    files = [{"file_path": "uploads/statement.pdf", "filename": "statement.pdf", "password": password}]
+    return client.post("/jobs/analyze", json={"files": files, "session_id": "s1"}).json["data"]
+
+
+def wait(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}?session_id=s1").json["data"]
+        if job["status"] not in ("queued", "running"):
+            return job
+        time.sleep(0.05)
+    pytest.fail(f"Job {job_id} did not finish")
+
+
+def test_resubmitting_with_the_right_password_reruns_the_analysis(client):
+    first = submit(client, "wrong")
+    result = wait(client, first["job_id"])["result"]["results"][0]
+    assert result["status"] == "error" and result["password_required"]
+
+    second = submit(client, PASSWORD)
+    assert not second["deduplicated"]
+    assert second["job_id"] != first["job_id"]
+    assert wait(client, second["job_id"])["result"]["results"][0]["status"] == "success"
+
+    # A fully parsed job is reused while its staged results exist
+    again = submit(client, PASSWORD)
+    assert again == {"job_id": second["job_id"], "deduplicated": True}
+
+
+def test_failed_files_are_not_reused(client):
+    first = submit(client)
+    assert wait(client, first["job_id"])["result"]["results"][0]["status"] == "error"
+    second = submit(client)
+    assert not second["deduplicated"]
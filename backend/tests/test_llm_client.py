@@ -0,0 +1,126 @@
+import threading
+import time
+from types import SimpleNamespace
+import httpx
+import openai
+import pytest
+from services import llm_client as llm_client_module
+from services.llm_client import LLMClient, RateLimiter
+
+
+def api_error(error_class, status, retry_after=None):
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://llm.test/chat"))
+    return error_class(f"HTTP {status}", response=response, body=None)
+
+
+class StubCompletions:
+    """Stands in for ``client.chat.completions``: raises the scripted errors, then echoes the prompt"""
+
+    def __init__(self, errors=(), on_call=None):
+        self.errors = list(errors)
+        self.on_call = on_call
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def create(self, model, messages, temperature, timeout):
+        prompt = messages[0]["content"]
+        with self._lock:
+            self.prompts.append(prompt)
+            if self.on_call:
+                self.on_call(prompt)
+            error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f" reply to {prompt} "))])
+
+
+class FakeClock:
+    """Virtual time for the rate limiter: sleeping advances the clock"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.now += seconds
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays the client slept for, without actually sleeping"""
+    delays = []
+    monkeypatch.setattr(llm_client_module, "time", SimpleNamespace(monotonic=time.monotonic, sleep=delays.append))
+    return delays
+
+
+def make_client(completions, max_retries=3, max_concurrency=4, rate_limiter=None):
+    client = LLMClient(max_concurrency=max_concurrency, max_retries=max_retries, rate_limiter=rate_limiter or RateLimiter())
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return client
+
+
+def test_retry_after_is_honoured(sleeps):
+    completions = StubCompletions([
+        api_error(openai.RateLimitError, 429, retry_after=2),
+        api_error(openai.InternalServerError, 503, retry_after=0.5),
+    ])
+    assert make_client(completions).complete("p", model="m") == "reply to p"
+    assert len(completions.prompts) == 3
+    assert sleeps == [2.0, 0.5]
+
+
+def test_backoff_is_bounded_and_retries_stop_at_the_limit(sleeps):
+    completions = StubCompletions([api_error(openai.InternalServerError, 500) for _ in range(10)])
+    with pytest.raises(openai.InternalServerError):
+        make_client(completions, max_retries=3).complete("p", model="m")
+    assert len(completions.prompts) == 4
+    assert len(sleeps) == 3
+    for attempt, delay in enumerate(sleeps):
+        assert 0 <= delay <= min(LLMClient.BACKOFF_CAP, LLMClient.BACKOFF_BASE * 2 ** attempt)
+
+
+def test_non_retryable_errors_fail_straight_away(sleeps):
+    completions = StubCompletions([api_error(openai.BadRequestError, 400)])
+    with pytest.raises(openai.BadRequestError):
+        make_client(completions).complete("p", model="m")
+    assert len(completions.prompts) == 1
+    assert sleeps == []
+
+
+def test_complete_many_keeps_prompt_order_and_returns_failures_in_place(sleeps):
+    completions = StubCompletions([api_error(openai.RateLimitError, 429, retry_after=1)])
+    prompts = [f"p{n}" for n in range(6)]
+    replies = make_client(completions, max_retries=0).complete_many(prompts, model="m")
+    assert sum(isinstance(reply, openai.RateLimitError) for reply in replies) == 1
+    for prompt, reply in zip(prompts, replies):
+        assert isinstance(reply, openai.RateLimitError) or reply == f"reply to {prompt}"
+    assert len(completions.prompts) == 6
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 4])
+def test_complete_many_is_paced_by_the_rate_limiter(sleeps, max_concurrency):
+    clock = FakeClock()
+    # Two requests a minute: a burst of two, then one every 30 seconds
+    limiter = RateLimiter(requests_per_minute=2, clock=clock, sleep=clock.sleep)
+    call_times = []
+    completions = StubCompletions(
+        [api_error(openai.RateLimitError, 429, retry_after=0)],
+        on_call=lambda prompt: call_times.append(clock()),
+    )
+    prompts = [f"p{n}" for n in range(5)]
+    client = make_client(completions, max_concurrency=max_concurrency, rate_limiter=limiter)
+    replies = client.complete_many(prompts, model="m")
+    assert replies == [f"reply to {prompt}" for prompt in prompts]
+    # The retried 429 goes through the limiter as well
+    assert len(call_times) == 6
+    if max_concurrency == 1:
+        assert call_times == [0.0, 0.0, 30.0, 60.0, 90.0, 120.0]
+    else:
+        # Threads waiting together may each advance the fake clock, so only the lower bound is exact
+        assert max(call_times) >= 120.0
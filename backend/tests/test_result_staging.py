@@ -0,0 +1,56 @@
+import glob
+import math
+import pandas as pd
+import pytest
+
+from services.result_staging import ResultStaging
+
+COLUMNS = ["Date", "Narration", "Chq/Ref No", "Value Date", "Debit Amount", "Credit Amount", "Closing Balance", "Source"]
+
+
+def chunk(rows):
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+@pytest.fixture(params=["parquet", "pickle"])
+def staging(request, tmp_path, monkeypatch):
+    if request.param == "parquet":
+        pytest.importorskip("pyarrow")
+    monkeypatch.setattr(ResultStaging, "FORMAT", request.param)
+    return ResultStaging(str(tmp_path), ttl=3600)
+
+
+def test_parts_are_staged_with_one_typed_schema(staging):
+    # Amounts as text with separators, all missing, and already numeric: one part each
+    parts = [
+        chunk([["01/04/2024", "UPI-ZOMATO", 123, None, "1,250.50", None, "10,000", "HDFC"]]),
+        chunk([["02/04/2024", "POS 1234 SHOP", None, None, None, None, None, "HDFC"]]),
+        chunk([["03/04/2024", "ATW-CASH", "0042", "03/04/2024", 500.0, "-", 9249.5, "HDFC"]]),
+    ]
+    with staging.writer("session", "statements/april.csv") as staged:
+        for part in parts:
+            staged.write(part)
+
+    if staging.FORMAT == "parquet":
+        schemas = {
+            tuple(pd.read_parquet(path).dtypes.astype(str))
+            for path in glob.glob(f"{staging.root}/session/*/part-*")
+        }
+        assert len(schemas) == 1
+
+    df = staging.load("session", staged.staged_id)
+    for column in ResultStaging.AMOUNT_COLUMNS:
+        assert df[column].dtype == "float64"
+    assert df["Debit Amount"].tolist()[::2] == [1250.5, 500.0]
+    assert math.isnan(df["Credit Amount"][2])
+    assert df["Closing Balance"][0] == 10000.0
+    assert df["Chq/Ref No"].tolist() == ["123", None, "0042"]
+    assert df["Narration"].tolist() == ["UPI-ZOMATO", "POS 1234 SHOP", "ATW-CASH"]
+
+
+def test_writing_leaves_the_callers_frame_alone(staging):
+    part = chunk([["01/04/2024", "UPI-ZOMATO", None, None, "1,250.50", None, None, "HDFC"]])
+    with staging.writer("session", "statements/april.csv") as staged:
+        staged.write(part)
+
+    assert part["Debit Amount"].tolist() == ["1,250.50"]
@@ -0,0 +1,33 @@
+import pytest
+
+from services.tag_cache import TagSuggestionCache
+
+
+def cache(tmp_path, scope):
+    return TagSuggestionCache(str(tmp_path / "tags.db"), ttl=3600, lru_size=100, scope=scope)
+
+
+def test_session_scope_keeps_sessions_apart(tmp_path):
+    writer = cache(tmp_path, "session")
+    writer.put_many({writer.key("UPI-RAHUL SHARMA", 250, "alice"): "Contact"})
+
+    # A fresh instance reads the durable table, not just the writer's LRU
+    reader = cache(tmp_path, "session")
+    assert reader.get_many([reader.key("upi rahul sharma", 300, "alice")]) == {
+        reader.key("UPI-RAHUL SHARMA", 250, "alice"): "Contact"
+    }
+    assert reader.get_many([reader.key("UPI-RAHUL SHARMA", 250, "bob")]) == {}
+    with pytest.raises(ValueError):
+        reader.key("UPI-RAHUL SHARMA", 250)
+
+
+def test_shared_scope_reuses_answers_across_sessions(tmp_path):
+    shared = cache(tmp_path, "shared")
+    shared.put_many({shared.key("ZOMATO", 450, "alice"): "Food"})
+
+    assert shared.get_many([shared.key("ZOMATO", 450, "bob")]) == {shared.key("ZOMATO", 450): "Food"}
+
+
+def test_unknown_scope_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        cache(tmp_path, "global")
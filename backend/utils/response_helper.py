@@ -1,4 +1,12 @@
-from flask import jsonify
+import json
+from datetime import date
+from decimal import Decimal
+from flask import Response, jsonify, stream_with_context
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder produces the same output, only slower
+    orjson = None
 
 def success_response(data, status_code=200):
     """Create a standardized success response"""
@@ -12,4 +20,26 @@ def error_response(message, status_code=400):
     return jsonify({
         'success': False,
         'error': message
-    }), status_code
\ No newline at end of file
+    }), status_code
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    if hasattr(value, 'item'):  # numpy scalars
+        return value.item()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def ndjson_line(record):
+    """Serialize one record as a newline-terminated JSON line (bytes)"""
+    if orjson is not None:
+        return orjson.dumps(
+            record, default=_json_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE
+        )
+    return (json.dumps(record, default=_json_default, separators=(',', ':')) + '\n').encode('utf-8')
+
+def ndjson_response(records, status_code=200):
+    """Stream an iterable of records as application/x-ndjson, one line per record as it is produced"""
+    lines = (ndjson_line(record) for record in records)
+    return Response(stream_with_context(lines), status=status_code, mimetype='application/x-ndjson')
@@ -0,0 +1,24 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+_initialized_schemas = set()
+
+
+@contextmanager
+def sqlite_connection(path, schema=None):
+    """Open a short-lived SQLite connection, creating the file and schema on first use.
+
+    The block runs in a transaction that is committed on success and rolled
+    back on error; the connection is always closed afterwards.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    connection = sqlite3.connect(path, timeout=5)
+    try:
+        with connection:
+            if schema and (path, schema) not in _initialized_schemas:
+                connection.executescript(schema)
+                _initialized_schemas.add((path, schema))
+            yield connection
+    finally:
+        connection.close()
@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useMemo } from 'react';
 import { Search, Filter, Edit2, Check, X, ChevronDown, ChevronUp } from 'lucide-react';
 import { format } from 'date-fns';
-import { apiService } from '../services/api';  // <-- Import our service
+import { apiService, TransactionPageQuery } from '../services/api';  // <-- Import our service
 import { Button } from './ui/Button';
 import { ArrowLeft, ArrowRight, Upload, Sparkles, FileText, Download, Plus } from 'lucide-react';
 import { ProductTagMapping, VisualizationConfig } from '../types';
@@ -19,10 +19,20 @@ interface Transaction {
 }
 
 interface SortConfig {
-  key: keyof Transaction | null;
+  key: TransactionPageQuery['sort'] | null;
   direction: 'asc' | 'desc';
 }
 
+// Column header -> server-side sort key; Narration has no index to sort on
+const SORT_KEYS: Record<string, TransactionPageQuery['sort']> = {
+  'Date': 'date',
+  'Product': 'product',
+  'Debit Amount': 'debit_amount',
+  'Credit Amount': 'credit_amount',
+  'Tag': 'tag',
+  'Mode': 'mode',
+};
+
 interface FilterState {
   [key: string]: string;
 }
@@ -52,20 +62,36 @@ export const EditDashboardView: React.FC<EditDashboardViewProps> = ({
     newProduct: string;
   } | null>(null);
 
-  // Pagination state
+  // Keyset pagination: the server returns one page plus the cursor of the next;
+  // pageCursors[i] is the cursor that loads page i + 1.
   const [currentPage, setCurrentPage] = useState(1);
+  const [pageCursors, setPageCursors] = useState<(string | null)[]>([null]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const itemsPerPage = 10;
 
+  const pageQuery = useMemo<TransactionPageQuery>(() => ({
+    limit: itemsPerPage,
+    sort: sortConfig.key ?? undefined,
+    direction: sortConfig.direction,
+    filters: { tag: filters.tag, mode: filters.mode, search: searchTerm || undefined },
+  }), [sortConfig, filters, searchTerm]);
 
+  // Sorting, filtering or searching starts over from the first page (debounced while typing)
   useEffect(() => {
-    fetchTransactions();
-  }, []); 
-  
-  const fetchTransactions = async () => {
+    const timer = setTimeout(() => {
+      setCurrentPage(1);
+      setPageCursors([null]);
+      fetchTransactions(null);
+    }, 300);
+    return () => clearTimeout(timer);
+  }, [pageQuery]);
+
+  const fetchTransactions = async (cursor: string | null) => {
     try {
-      const response = await apiService.getTransactions();
+      const response = await apiService.getTransactions({ ...pageQuery, cursor });
       if (!response.success || !response.data) throw new Error('Failed to fetch transactions');
       setTransactions(response.data);
+      setNextCursor(response.next_cursor ?? null);
     } catch (err) {
       setError(err instanceof Error ? err.message : 'Failed to load transactions');
     } finally {
@@ -73,42 +99,26 @@ export const EditDashboardView: React.FC<EditDashboardViewProps> = ({
     }
   };
 
-  const handleSort = (key: keyof Transaction) => {
+  const refreshCurrentPage = () => fetchTransactions(pageCursors[currentPage - 1]);
+
+  const handleSort = (key: TransactionPageQuery['sort']) => {
     setSortConfig(current => ({
       key,
       direction: current.key === key && current.direction === 'asc' ? 'desc' : 'asc'
     }));
   };
 
-  const sortedTransactions = useMemo(() => {
-    if (!sortConfig.key) return transactions;
-    return [...transactions].sort((a, b) => {
-      if (a[sortConfig.key!] < b[sortConfig.key!]) return sortConfig.direction === 'asc' ? -1 : 1;
-      if (a[sortConfig.key!] > b[sortConfig.key!]) return sortConfig.direction === 'asc' ? 1 : -1;
-      return 0;
-    });
-  }, [transactions, sortConfig]);
+  const currentTransactions = transactions;
 
-  const filteredTransactions = useMemo(() => {
-    return sortedTransactions.filter(transaction => {
-      const matchesSearch = Object.values(transaction).some(value =>
-        String(value).toLowerCase().includes(searchTerm.toLowerCase())
-      );
-      const matchesFilters = Object.entries(filters).every(([key, value]) =>
-        String(transaction[key as keyof Transaction]).toLowerCase().includes(value.toLowerCase())
-      );
-      return matchesSearch && matchesFilters;
-    });
-  }, [sortedTransactions, searchTerm, filters]);
-
-  // Pagination logic
-  const indexOfLastItem = currentPage * itemsPerPage;
-  const indexOfFirstItem = indexOfLastItem - itemsPerPage;
-  const currentTransactions = filteredTransactions.slice(indexOfFirstItem, indexOfLastItem);
-  const totalPages = Math.ceil(filteredTransactions.length / itemsPerPage);
-
-  const handlePageChange = (page: number) => {
-    if (page >= 1 && page <= totalPages) setCurrentPage(page);
+  const handlePageChange = async (page: number) => {
+    if (page === currentPage + 1 && nextCursor) {
+      setPageCursors(current => [...current.slice(0, currentPage), nextCursor]);
+      await fetchTransactions(nextCursor);
+      setCurrentPage(page);
+    } else if (page === currentPage - 1 && page >= 1) {
+      await fetchTransactions(pageCursors[page - 1]);
+      setCurrentPage(page);
+    }
   };
 
 
@@ -117,7 +127,7 @@ export const EditDashboardView: React.FC<EditDashboardViewProps> = ({
       const product = transactions.find(t => t.id === transactionId)?.product || '';
       const response = await apiService.updateTag(transactionId, newTag, applyToAll, product);
       if (!response.success) throw new Error('Failed to update tag');
-      await fetchTransactions();
+      await refreshCurrentPage();
       setEditingId(null);
       setEditMode(null);
     } catch (err) {
@@ -136,7 +146,7 @@ export const EditDashboardView: React.FC<EditDashboardViewProps> = ({
         currentTransaction?.tag || ''
       );
       if (!response.success) throw new Error('Failed to update product');
-      await fetchTransactions();
+      await refreshCurrentPage();
       setEditingId(null);
       setEditMode(null);
       setShowReplaceDialog(false);
@@ -240,11 +250,11 @@ export const EditDashboardView: React.FC<EditDashboardViewProps> = ({
                   className={`px-6 py-3 text-left text-xs font-medium uppercase tracking-wider cursor-pointer  ${
                     header === 'Actions' ? 'w-32' : 'min-w-[120px]'
                   }`}
-                  onClick={() => header !== 'Actions' && handleSort(header.toLowerCase() as keyof Transaction)}
+                  onClick={() => SORT_KEYS[header] && handleSort(SORT_KEYS[header])}
                 >
                   <div className="flex items-center gap-2">
                     {header}
-                    {sortConfig.key === header.toLowerCase() && (
+                    {SORT_KEYS[header] && sortConfig.key === SORT_KEYS[header] && (
                       sortConfig.direction === 'asc' ? <ChevronUp className="w-4 h-4" /> : <ChevronDown className="w-4 h-4" />
                     )}
                   </div>
@@ -340,12 +350,12 @@ export const EditDashboardView: React.FC<EditDashboardViewProps> = ({
           Previous
         </button>
         <span className="text-sm text-gray-600">
-          Page {currentPage} of {totalPages}
+          Page {currentPage}
         </span>
         <button
           className="px-4 py-2 bg-gray-200 rounded hover:bg-gray-300 disabled:opacity-50"
           onClick={() => handlePageChange(currentPage + 1)}
-          disabled={currentPage === totalPages}
+          disabled={!nextCursor}
         >
           Next
         </button>
@@ -124,9 +124,10 @@ export const ExpenseVisualizationView: React.FC<ExpenseVisualizationViewProps> =
       }
 
       // Step 2: Consolidate files
+      // Staged files are referenced by handle; their transactions are already on the server
       const filesData = files.filter(f => f.preview_data && f.preview_data.length > 0).map(f => ({
         filename: f.file.name,
-        transactions: f.preview_data,
+        ...(f.staged_id ? { staged_id: f.staged_id } : { transactions: f.preview_data }),
         source: f.classification  // Add the credit/debit classification from the file
       }));
 
@@ -151,7 +151,8 @@ export const FileAnalyzer: React.FC = () => {
           return {
             ...file,
             preview_data: result.transactions || [],
-            total_rows: result.total_transactions || 0
+            total_rows: result.total_transactions || 0,
+            staged_id: result.staged_id
           };
         } else if (result && result.status === 'error') {
           return {
@@ -43,6 +43,23 @@ export interface UploadResponse {
   error?: string;
 }
 
+/** Keyset page request for /edit; `cursor` is the previous page's `next_cursor`. */
+export interface TransactionPageQuery {
+  limit?: number;
+  cursor?: string | null;
+  sort?: 'date' | 'product' | 'debit_amount' | 'credit_amount' | 'tag' | 'mode' | 'id';
+  direction?: 'asc' | 'desc';
+  fields?: string[];
+  filters?: {
+    tag?: string;
+    mode?: string;
+    product?: string;
+    date_from?: string;
+    date_to?: string;
+    search?: string;
+  };
+}
+
 export interface AnalysisResponse {
   success: boolean;
   data?: {
@@ -54,6 +71,7 @@ export interface AnalysisResponse {
       transaction_count?: number;
       transactions?: any[];
       total_transactions?: number;
+      staged_id?: string;
       message?: string;
       password_required?: boolean;
     }>;
@@ -61,6 +79,21 @@ export interface AnalysisResponse {
   error?: string;
 }
 
+type AnalysisFileResult = NonNullable<AnalysisResponse['data']>['results'][number];
+
+/** Position of a file in the /analyze request and its S3 key; filenames need not be unique. */
+interface AnalysisStreamFile {
+  file_index: number;
+  file_path: string;
+}
+
+/** One NDJSON line of a streaming /analyze response. */
+export type AnalysisStreamRecord =
+  | ({ type: 'transactions'; filename: string; transactions: any[] } & AnalysisStreamFile)
+  | ({ type: 'result' } & AnalysisStreamFile & AnalysisFileResult)
+  | { type: 'done'; message: string; file_count: number }
+  | { type: 'error'; error: string };
+
 export interface SampleMappingsResponse {
   success: boolean;
   data?: {
@@ -160,20 +193,72 @@ class ApiService {
     
   }
   
+  /**
+   * Runs /analyze in streaming mode: the backend sends one NDJSON line per
+   * chunk of transactions and per file result as each is ready. Results are
+   * reassembled into the usual AnalysisResponse; `onProgress` sees every line.
+   */
   async analyzeFiles(filesData: Array<{
     filename: string;
     file_path: string;
     classification: string;
     password?: string | null;
-  }>): Promise<AnalysisResponse> {
+  }>, onProgress?: (record: AnalysisStreamRecord) => void): Promise<AnalysisResponse> {
+    assertApiBase();
     const sessionId = sessionManager.getSessionId();
-    return this.makeRequest<AnalysisResponse>('/analyze', {
+    const response = await fetch(`${API_BASE_URL}/analyze`, {
       method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'Accept': 'application/x-ndjson',
+      },
+      credentials: 'include',
       body: JSON.stringify({ 
         files: filesData,
-        session_id: sessionId 
+        session_id: sessionId,
+        stream: true
       }),
     });
+
+    if (!response.ok || !response.body) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    // Files finish in any order; buffer and place everything by request position
+    const transactions: Record<number, any[]> = {};
+    const results: AnalysisFileResult[] = [];
+    let message = '';
+    const handle = (record: AnalysisStreamRecord) => {
+      onProgress?.(record);
+      if (record.type === 'transactions') {
+        (transactions[record.file_index] ??= []).push(...record.transactions);
+      } else if (record.type === 'result') {
+        const { type, file_index, file_path, ...result } = record;
+        results[file_index] = result.status === 'success'
+          ? { ...result, transactions: transactions[file_index] ?? [] }
+          : result;
+        delete transactions[file_index];
+      } else if (record.type === 'done') {
+        message = record.message;
+      } else if (record.type === 'error') {
+        throw new Error(record.error);
+      }
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      buffered += decoder.decode(value, { stream: !done });
+      const lines = buffered.split('\n');
+      buffered = lines.pop() ?? '';
+      lines.filter(line => line.trim()).forEach(line => handle(JSON.parse(line)));
+      if (done) break;
+    }
+    if (buffered.trim()) handle(JSON.parse(buffered));
+
+    return { success: true, data: { message, results: results.filter(Boolean) } };
   }
 
   async downloadResults(filename: string): Promise<Blob> {
@@ -238,12 +323,14 @@ class ApiService {
   }
 
 
-  async getTransactions(): Promise<{ success: boolean; data?: any; error?: string }> {
+  async getTransactions(
+    query: TransactionPageQuery = {}
+  ): Promise<{ success: boolean; data?: any; next_cursor?: string | null; error?: string }> {
     const sessionId = sessionManager.getSessionId();
     if (!sessionId) throw new Error("Session ID missing");
     return this.makeRequest('/edit', {
       method: 'POST',
-      body: JSON.stringify({ session_id: sessionId }),
+      body: JSON.stringify({ session_id: sessionId, ...query }),
     });
   }
   
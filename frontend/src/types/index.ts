@@ -16,6 +16,8 @@ export interface FileWithStatus {
   // Analysis results
   preview_data?: Transaction[];
   total_rows?: number;
+  // Handle to the parsed results kept on the server, sent to /consolidate-files instead of preview_data
+  staged_id?: string;
   error_message?: string;
 }
 
@@ -35,6 +37,7 @@ export interface AnalysisResult {
   transaction_count?: number;
   transactions?: Transaction[];
   total_transactions?: number;
+  staged_id?: string;
   message?: string;
   password_required?: boolean;
 }
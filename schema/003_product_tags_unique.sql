@@ -0,0 +1,9 @@
+-- One tag row per (session, product): drop older duplicates, then enforce it
+DELETE older FROM product_tags older
+JOIN product_tags newer
+    ON newer.session_id = older.session_id
+    AND newer.product = older.product
+    AND newer.id > older.id;
+
+ALTER TABLE product_tags
+    ADD UNIQUE KEY uq_product_tags_session_product (session_id, product);
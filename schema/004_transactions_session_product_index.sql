@@ -0,0 +1,6 @@
+-- Tag and rename updates filter transactions on (session_id, product).
+-- product is VARCHAR(1000), too wide for a full utf8mb4 key, so index a prefix;
+-- the composite index also serves session_id-only lookups, replacing idx_session_id.
+CREATE INDEX idx_transactions_session_product ON transactions (session_id, product(255));
+
+DROP INDEX idx_session_id ON transactions;
@@ -0,0 +1,7 @@
+-- Keyset pagination for /edit: each filter or sort column is indexed after
+-- session_id, with id last as the tie-breaker the cursor resumes from.
+CREATE INDEX idx_transactions_session_date ON transactions (session_id, transaction_date, id);
+CREATE INDEX idx_transactions_session_tag ON transactions (session_id, tag, id);
+CREATE INDEX idx_transactions_session_mode ON transactions (session_id, mode, id);
+CREATE INDEX idx_transactions_session_debit ON transactions (session_id, debit_amount, id);
+CREATE INDEX idx_transactions_session_credit ON transactions (session_id, credit_amount, id);